@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Disk-backed cache for AI sector classifications.
+
+Results are keyed by a normalized company name so that trivial differences in
+casing, spacing or punctuation ("ธนาคารกรุงไทย" vs " ธนาคาร กรุงไทย ฯ") hit the
+same entry. Every row records the prompt version it was produced with; rows
+from an older prompt or sector list are treated as misses.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_CACHE_PATH = os.environ.get("SECTOR_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_cache.sqlite3"))
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50_000
+
+# Zero-width characters often pasted in with Thai text from web pages / PDFs
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+# Thai punctuation (ไปยาลน้อย ฯ, ฟองมัน ๏, อังคั่นคู่ ๚, โคมูตร ๛) and common ASCII punctuation
+_PUNCT_RE = re.compile(r"[ฯ๏๚๛.,;:!?'\"`()\[\]{}<>/\\|\-_&+*#@~^=]")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Thai is written without word spaces, so a space between two Thai characters is noise
+_THAI_GAP_RE = re.compile(r"(?<=[\u0e00-\u0e7f]) (?=[\u0e00-\u0e7f])")
+
+
+def normalize_name(name):
+    """Returns a canonical form of an organization name for use as a cache key."""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKC", name).casefold()
+    text = _ZERO_WIDTH_RE.sub("", text)
+    text = _PUNCT_RE.sub(" ", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return _THAI_GAP_RE.sub("", text)
+
+
+def prompt_version(*parts):
+    """Hashes everything that shapes the AI answer (prompt, labels, model) into a short tag."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+class ClassificationCache:
+    """SQLite-backed store of (sector, reason) per normalized name with TTL and LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version="", ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.version = version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Streamlit runs each session on its own thread, so one connection is shared under a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS classifications (
+                   name_key TEXT PRIMARY KEY,
+                   company_name TEXT NOT NULL,
+                   sector TEXT,
+                   reason TEXT,
+                   model TEXT,
+                   prompt_version TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_classifications_last_access ON classifications(last_access)"
+        )
+        self._purge_stale()
+
+    def _purge_stale(self):
+        """Drops rows written under another prompt version or past their TTL."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM classifications WHERE prompt_version != ? OR created_at < ?",
+                (self.version, time.time() - self.ttl_seconds),
+            )
+
+    def get(self, company_name):
+        """Returns the cached (sector, reason) for a name, or None on a miss."""
+        key = normalize_name(company_name)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sector, reason, prompt_version, created_at FROM classifications WHERE name_key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            sector, reason, version, created_at = row
+            if version != self.version or created_at < now - self.ttl_seconds:
+                self._conn.execute("DELETE FROM classifications WHERE name_key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE classifications SET last_access = ? WHERE name_key = ?", (now, key))
+        return sector, reason
+
+    def set(self, company_name, sector, reason, model=None):
+        """Stores a classification result and evicts the least recently used rows beyond max_entries."""
+        key = normalize_name(company_name)
+        if not key:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO classifications
+                   (name_key, company_name, sector, reason, model, prompt_version, created_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, company_name, sector, reason, model, self.version, now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                """DELETE FROM classifications WHERE name_key IN (
+                       SELECT name_key FROM classifications ORDER BY last_access ASC LIMIT ?
+                   )""",
+                (excess,),
+            )
+
+    def items(self):
+        """Returns [(company name, sector)] for every live entry with a sector, most recently used first."""
+        with self._lock:
+            return self._conn.execute(
+                """SELECT company_name, sector FROM classifications
+                   WHERE sector IS NOT NULL AND prompt_version = ? AND created_at >= ?
+                   ORDER BY last_access DESC""",
+                (self.version, time.time() - self.ttl_seconds),
+            ).fetchall()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM classifications")
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
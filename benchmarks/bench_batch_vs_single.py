@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: tokens per company and wall time, one-at-a-time vs batched AI classification.
+
+Runs offline against cohere_stub.StubCohere, whose latency grows with the
+tokens it reads and writes, and which drops a share of the items in every
+batched answer so the re-query path is exercised. Token counts use
+sector_core.estimate_tokens, so read them as relative, not billed, numbers.
+Run from the repository root:
+
+    python benchmarks/bench_batch_vs_single.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["SECTOR_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_cache.sqlite3")
+# Measure the calls themselves, not the shared rate limiter
+os.environ.setdefault("SECTOR_AI_RATE_PER_MINUTE", "1000000")
+
+import sector_core  # noqa: E402
+from cohere_stub import StubCohere  # noqa: E402
+
+COMPANIES = 120
+BASE_LATENCY = 0.02           # seconds per request
+LATENCY_PER_INPUT_TOKEN = 0.000005
+LATENCY_PER_OUTPUT_TOKEN = 0.0002
+BATCH_DROP_RATE = 0.05        # share of items a batched answer silently omits
+
+STEMS = ["สยาม", "ไทย", "กรุงเทพ", "เจริญ", "Siam", "Asia", "Golden", "Prime"]
+KINDS = [("ธนาคาร{}", "Banking / Finance / Insurance (BFSI)"), ("{} Logistics", "Retail / SME / Logistics"),
+         ("โรงพยาบาล{}", "Healthcare"), ("{} Software", "Software / Tech / SaaS"), ("{} Steel", "Manufacturing / OT-heavy")]
+
+
+def run(label, names, classify, stub):
+    sector_core.get_ai_cache().clear()
+    usage = {}
+    stub.requests = stub.input_tokens = stub.output_tokens = 0
+    start = time.perf_counter()
+    results = classify(names, usage)
+    elapsed = time.perf_counter() - start
+    resolved = sum(1 for sector, _ in results if sector)
+    print(f"{label:<22} | {stub.requests:>8} | {stub.input_tokens / len(names):>13.0f} | "
+          f"{stub.output_tokens / len(names):>14.0f} | {elapsed:>8.2f} | {resolved:>4}/{len(names)}")
+
+
+def main():
+    rng = random.Random(7)
+    truth = {}
+    while len(truth) < COMPANIES:
+        template, sector = rng.choice(KINDS)
+        truth[template.format(rng.choice(STEMS)) + str(rng.randint(1, 999))] = sector
+    names = list(truth)
+    stub = StubCohere(latency=BASE_LATENCY, latency_per_input_token=LATENCY_PER_INPUT_TOKEN,
+                      latency_per_output_token=LATENCY_PER_OUTPUT_TOKEN, drop_rate=BATCH_DROP_RATE, truth=truth, seed=7)
+    sector_core.get_client = lambda: stub
+
+    def one_at_a_time(names, usage):
+        return [sector_core.classify_with_ai(name) for name in names]
+
+    print(f"{COMPANIES} companies, stubbed Cohere ({BATCH_DROP_RATE:.0%} of batched items dropped)")
+    print(f"{'path':<22} | {'requests':>8} | {'input tok/co':>13} | {'output tok/co':>14} | {'wall s':>8} | resolved")
+    run("one at a time", names, one_at_a_time, stub)
+    run("batched", names, sector_core.classify_many_with_ai, stub)
+
+
+if __name__ == "__main__":
+    main()
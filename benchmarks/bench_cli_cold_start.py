@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Cold-start time of the headless CLI path versus importing the Streamlit app's dependencies.
+
+Each measurement is a fresh interpreter. Also checks that the CLI path never
+imports streamlit, pandas or cohere. Run from the repository root:
+
+    python benchmarks/bench_cli_cold_start.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 7
+
+CASES = [
+    ("python -c pass (interpreter floor)", [sys.executable, "-c", "pass"]),
+    ("sector_cli.py classify --no-ai", [sys.executable, "sector_cli.py", "classify", "--no-ai", "ธนาคารกรุงไทย"]),
+    ("import streamlit, cohere, pandas", [sys.executable, "-c", "import streamlit, cohere, pandas"]),
+]
+
+HEAVY_CHECK = (
+    "import sys, sector_cli; sector_cli.main(['classify', '--no-ai', 'x']); "
+    "heavy = [m for m in ('streamlit', 'pandas', 'cohere') if m in sys.modules]; "
+    "assert not heavy, heavy"
+)
+
+
+def wall_ms(cmd):
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1e3
+
+
+def main():
+    subprocess.run([sys.executable, "-c", HEAVY_CHECK], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    print("CLI path imports no streamlit / pandas / cohere: OK")
+    for label, cmd in CASES:
+        wall_ms(cmd)  # warm the OS file cache
+        samples = [wall_ms(cmd) for _ in range(RUNS)]
+        print(f"{label:<40} median {statistics.median(samples):7.1f} ms   min {min(samples):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark: static matching latency as the org registry grows.
+
+Compares the original linear scans (`item.lower() in name_lower` over every
+entry) with the precompiled OrgMatcher / SuggestionIndex on synthetic
+registries of increasing size, and times FuzzyIndex ranked search and
+near-miss matching on misspelt names. Run from the repository root:
+
+    python benchmarks/bench_static_match.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from org_matcher import FuzzyIndex, OrgMatcher, SuggestionIndex  # noqa: E402
+
+PREFIXES = ["กรม", "การไฟฟ้า", "ธนาคาร", "สำนักงาน", "มหาวิทยาลัย", "บริษัท", "การท่าเรือ", "กองทัพ"]
+SYLLABLES = ["กรุง", "ไทย", "พาณิชย์", "เกษตร", "สุข", "ภาพ", "ราช", "นคร", "ศรี", "อยุธยา", "ชล", "ประทาน",
+             "ขนส่ง", "พลังงาน", "ดิจิทัล", "การค้า", "ภายใน", "ต่างประเทศ", "Logistics", "Bank", "Tech"]
+SIZES = [60, 1_000, 10_000, 50_000]
+QUERIES_PER_SIZE = 300
+SUGGESTION_LIMIT = 50  # mirrors MAX_SUGGESTIONS in sector.py
+REPEATS = 3
+
+
+def synthetic_registry(size, rng):
+    names = set()
+    while len(names) < size:
+        parts = [rng.choice(PREFIXES)] + [rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))]
+        names.add("".join(parts) + str(rng.randint(0, size)))
+    return sorted(names)
+
+
+def misspell(name, rng):
+    """Drops one character from the middle of a name."""
+    cut = rng.randint(1, len(name) - 2)
+    return name[:cut] + name[cut + 1:]
+
+
+def naive_classify(lists, entity_name):
+    name_lower = entity_name.lower()
+    for label, names in lists:
+        if any(item.lower() in name_lower for item in names):
+            return label
+    return None
+
+
+def naive_suggestions(all_orgs, keyword):
+    keyword_lower = keyword.lower()
+    return [org for org in all_orgs if keyword_lower in org.lower()]
+
+
+def per_call_us(func, inputs):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for item in inputs:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(inputs) * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'orgs':>7} | {'build ms':>9} | {'classify naive':>14} | {'classify AC':>11} | "
+          f"{'suggest naive':>13} | {'suggest idx':>11} | {'fuzzy build ms':>14} | {'fuzzy rank':>10} | "
+          f"{'near miss':>9}   (µs per call)")
+    for size in SIZES:
+        registry = synthetic_registry(size, rng)
+        third = len(registry) // 3
+        lists = [("CII", registry[:third]), ("Regulator", registry[third:2 * third]), ("Gov", registry[2 * third:])]
+
+        start = time.perf_counter()
+        matcher = OrgMatcher(lists)
+        index = SuggestionIndex(registry)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        hits = [f"บริษัท {rng.choice(registry)} จำกัด" for _ in range(QUERIES_PER_SIZE // 2)]
+        misses = [f"Acme {rng.choice(SYLLABLES)} Co., Ltd. {i}" for i in range(QUERIES_PER_SIZE // 2)]
+        queries = hits + misses
+        keywords = [rng.choice(registry)[:rng.randint(2, 8)] for _ in range(QUERIES_PER_SIZE)]
+        typos = [misspell(rng.choice(registry), rng) for _ in range(QUERIES_PER_SIZE)]
+
+        start = time.perf_counter()
+        fuzzy = FuzzyIndex(registry)
+        fuzzy_build_ms = (time.perf_counter() - start) * 1e3
+
+        for query in queries:
+            assert matcher.classify(query) == naive_classify(lists, query), query
+        for keyword in keywords[:50]:
+            expected = naive_suggestions(registry, keyword)
+            assert index.search(keyword) == expected, keyword
+            assert index.search(keyword, limit=SUGGESTION_LIMIT) == expected[:SUGGESTION_LIMIT], keyword
+
+        # Small registries are timed on the full query set; large ones on a sample so naive scans finish
+        sample = queries if size <= 10_000 else queries[:30]
+        keyword_sample = keywords if size <= 10_000 else keywords[:30]
+        print(f"{size:>7,} | {build_ms:>9.1f} | "
+              f"{per_call_us(lambda q: naive_classify(lists, q), sample):>14.1f} | "
+              f"{per_call_us(matcher.classify, queries):>11.1f} | "
+              f"{per_call_us(lambda k: naive_suggestions(registry, k), keyword_sample):>13.1f} | "
+              f"{per_call_us(lambda k: index.search(k, limit=SUGGESTION_LIMIT), keywords):>11.1f} | "
+              f"{fuzzy_build_ms:>14.1f} | "
+              f"{per_call_us(lambda t: fuzzy.ranked_search(t[:10], k=10), typos):>10.1f} | "
+              f"{per_call_us(fuzzy.best_match, typos):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
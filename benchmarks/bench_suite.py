@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""Offline benchmark suite for the classify-and-render path, with stored baselines.
+
+Times the hot paths on synthetic org registries of increasing size (the NCSA
+lists padded with generated names) and reports p50 / p95 latency and peak
+traced memory per scenario:
+
+  * registry build, snapshot load, classify_statically (with and without
+    the typo pass) and find_suggestions per registry size
+  * parse_ai_response and classify_with_ai against cohere_stub (healthy and flaky)
+  * display_unified_recommendations, rendered through Streamlit's AppTest
+  * main_app() reruns of a results page per registry size, and cold
+    classifications whose AI call goes to the stub (first paint, and until
+    the AI answer shows)
+
+Cohere is replaced by cohere_stub, so nothing touches the network and the SDK
+is not needed. Results are compared with benchmarks/baselines.json. A p95 or
+memory figure worse than the baseline by more than --tolerance is a
+regression, and --check then exits non-zero. Baselines are machine-specific:
+refresh them with --update-baseline on the machine that runs the check.
+
+    python benchmarks/bench_suite.py [--quick] [--check] [--update-baseline]
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORK_DIR = tempfile.mkdtemp(prefix="sector_bench_")
+os.environ["SECTOR_CACHE_PATH"] = os.path.join(WORK_DIR, "ai_cache.sqlite3")
+os.environ["SECTOR_JOBS_PATH"] = os.path.join(WORK_DIR, "bulk_jobs.sqlite3")
+os.environ["SECTOR_REGISTRY_SNAPSHOT"] = os.path.join(WORK_DIR, "registry.snapshot")
+# Measure the code paths, not the shared rate limiter
+os.environ.setdefault("SECTOR_AI_RATE_PER_MINUTE", "1000000")
+
+import cohere_stub  # noqa: E402
+import resilience  # noqa: E402
+import sector_core  # noqa: E402
+from registry import Registry, load_snapshot, save_snapshot  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+APP_PATH = os.path.join(ROOT, "sector.py")
+SIZES = [1_000, 10_000, 100_000]
+QUERIES = 300
+APP_RERUNS = 20
+# A regression must also exceed these absolute margins, so sub-millisecond jitter never fails a check
+SLACK_MS = 0.05
+SLACK_MIB = 1.0
+
+PREFIXES = ["กรม", "การไฟฟ้า", "ธนาคาร", "สำนักงาน", "มหาวิทยาลัย", "บริษัท", "การท่าเรือ", "กองทัพ", "โรงพยาบาล"]
+SYLLABLES = ["กรุง", "ไทย", "พาณิชย์", "เกษตร", "สุข", "ภาพ", "ราช", "นคร", "ศรี", "อยุธยา", "ชล", "ประทาน",
+             "ขนส่ง", "พลังงาน", "ดิจิทัล", "การค้า", "ภายใน", "ต่างประเทศ", "Logistics", "Bank", "Tech"]
+REAL_REGISTRY = sector_core.get_registry()
+REAL_ORGS = list(REAL_REGISTRY.all_orgs)
+
+
+# --- Synthetic data ---
+def synthetic_names(count, rng, suffix=""):
+    names = set()
+    while len(names) < count:
+        parts = [rng.choice(PREFIXES)] + [rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))]
+        names.add("".join(parts) + str(rng.randint(0, 10 * count)) + suffix)
+    return sorted(names)
+
+
+def padded_registry(size, rng):
+    """The real registry with its NCSA lists padded with generated names up to `size` orgs."""
+    filler = synthetic_names(max(0, size - len(REAL_ORGS)), rng)
+    third = len(filler) // 3
+    bounds = [0, third, 2 * third, len(filler)]
+    lists = [(label, list(names) + filler[bounds[i]:bounds[i + 1]])
+             for i, (label, names) in enumerate(REAL_REGISTRY.static_lists)]
+    return Registry(lists, REAL_REGISTRY.aliases, REAL_REGISTRY.regulator_keywords, REAL_REGISTRY.sector_details,
+                    version=f"bench-{size}")
+
+
+def use_registry(size, rng):
+    """Installs a padded registry of `size` orgs in sector_core."""
+    registry = padded_registry(size, rng)
+    sector_core.install_registry(registry)
+    return registry
+
+
+def lookup_queries(orgs, rng, count=QUERIES):
+    """A third each: listed names inside a longer name, unlisted names, and one-character typos."""
+    queries = []
+    for i in range(count):
+        name = rng.choice(orgs)
+        if i % 3 == 0:
+            queries.append(f"{name} สาขา {i}")
+        elif i % 3 == 1:
+            queries.append(f"Acme {rng.choice(SYLLABLES)} Co., Ltd. {i}")
+        else:
+            cut = rng.randint(1, len(name) - 2)
+            queries.append(name[:cut] + name[cut + 1:])
+    return queries
+
+
+def reset_ai_state(stub):
+    sector_core.configure("offline-stub")
+    cohere_stub.install(stub)
+    sector_core.AI_BREAKER = resilience.CircuitBreaker(failure_threshold=5, recovery_timeout=30.0)
+    sector_core.get_ai_cache().clear()
+
+
+# --- Measurement ---
+def timed(func, inputs):
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_mib(func):
+    """Peak traced allocation while func runs, in MiB."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(samples, memory):
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1e3, 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1e3, 4),
+        "peak_mib": round(memory, 2),
+        "samples": len(ordered),
+    }
+
+
+def measure(func, inputs, memory_inputs=None):
+    """Latency over all inputs, then peak memory of a pass over a (smaller) slice, outside the timed loop."""
+    samples = timed(func, inputs)
+    subset = inputs if memory_inputs is None else memory_inputs
+    return summarize(samples, peak_mib(lambda: [func(item) for item in subset]))
+
+
+# --- Streamlit AppTest drivers ---
+def new_app():
+    from streamlit import config
+    from streamlit.testing.v1 import AppTest
+
+    # AppTest recompiles the script on every run (the server compiles it once), so apply the app's
+    # .streamlit/config.toml even when the suite is started from another directory
+    config.set_option("runner.magicEnabled", False)
+    app = AppTest.from_file(APP_PATH, default_timeout=600)
+    app.secrets["APP_PASSWORD"] = "bench"
+    app.secrets["COHERE_API_KEY"] = "offline-stub"
+    app.session_state["authenticated"] = True
+    app.run()
+    return app
+
+
+def classify_in_app(app, name):
+    """Searches for name and returns once the page shows the AI answer too; returns seconds to the first paint."""
+    start = time.perf_counter()
+    app.text_input(key="company_input").input(name)
+    app.button(key="search_button").click().run()
+    first_paint = time.perf_counter() - start
+    if any("Asking Cohere" in info.value for info in app.info):
+        # The AI column is filled from a background lookup; rerun once it is done, as its fragment would
+        app.session_state["ai_lookup"]["future"].result()
+        app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return first_paint
+
+
+def function_source(path, name):
+    source = open(path, encoding="utf-8").read()
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.FunctionDef) and node.name == name:
+            return ast.get_source_segment(source, node)
+    raise LookupError(f"{name} not found in {path}")
+
+
+RECOMMENDATIONS_SCRIPT = """
+import streamlit as st
+from sector_core import aggregate_recommendations
+
+{function}
+
+display_unified_recommendations({sectors!r})
+"""
+
+
+# --- Scenarios ---
+def bench_registry(size, rng, results):
+    registry = use_registry(size, rng)
+
+    def build(_):
+        Registry(registry.static_lists, registry.aliases, registry.regulator_keywords, registry.sector_details)
+
+    results[f"registry build n={size}"] = measure(build, range(3 if size <= 10_000 else 1), range(1))
+    snapshot_path = os.path.join(WORK_DIR, f"registry_{size}.snapshot")
+    save_snapshot(registry, snapshot_path)
+    results[f"registry snapshot load n={size}"] = measure(lambda _: load_snapshot(snapshot_path), range(5), range(1))
+
+    orgs = registry.all_orgs
+    queries = lookup_queries(orgs, rng)
+    results[f"classify_statically n={size}"] = measure(sector_core.classify_statically, queries, queries[:60])
+    # The interactive lookup also tries typos; bulk runs and the CLI do not
+    results[f"classify_statically typos=True n={size}"] = measure(
+        lambda query: sector_core.classify_statically(query, typos=True), queries, queries[:60])
+    keywords = [rng.choice(orgs)[:rng.randint(2, 8)] for _ in range(QUERIES)]
+    results[f"find_suggestions n={size}"] = measure(sector_core.find_suggestions, keywords, keywords[:60])
+
+
+def bench_ai_paths(rng, results, latency, failure_rate):
+    stub = cohere_stub.StubCohere(seed=1)
+    reset_ai_state(stub)
+    names = synthetic_names(QUERIES, rng, suffix=" จำกัด")
+    responses = [stub._answer(f"{sector_core.PROMPT_INSTRUCTION}\nCompany: {name}")[0].text for name in names]
+    results["parse_ai_response"] = measure(sector_core.parse_ai_response, responses * 5, responses[:60])
+    # Every name is new, so each call misses the cache and goes to the stub
+    results["classify_with_ai (stub, no latency)"] = measure(sector_core.classify_with_ai, names[:250], names[250:])
+    assert stub.requests >= len(names), "classify_with_ai did not reach the stub"
+
+    flaky_stub = cohere_stub.StubCohere(latency=latency, failure_rate=failure_rate, seed=2)
+    reset_ai_state(flaky_stub)
+    random.seed(2)  # backoff jitter
+    flaky = synthetic_names(50, rng, suffix=" มหาชน")
+    results[f"classify_with_ai (stub {latency * 1e3:.0f} ms, {failure_rate:.0%} failing)"] = measure(
+        sector_core.classify_with_ai, flaky[:45], flaky[45:])
+    assert flaky_stub.requests >= len(flaky), "classify_with_ai did not reach the stub"
+
+
+def bench_recommendations(results):
+    from streamlit.testing.v1 import AppTest
+
+    script = RECOMMENDATIONS_SCRIPT.format(
+        function=function_source(APP_PATH, "display_unified_recommendations"),
+        sectors=["Banking / Finance / Insurance (BFSI)", "Critical Infrastructure (CII)"],
+    )
+
+    app = AppTest.from_string(script, default_timeout=60)
+    app.run()  # warm-up: the first run also compiles the script and starts the session
+
+    def render(_):
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+
+    results["display_unified_recommendations (AppTest)"] = measure(render, range(APP_RERUNS), range(3))
+
+
+def bench_main_app(size, rng, results, latency, cold=False):
+    reset_ai_state(cohere_stub.StubCohere(latency=latency, seed=3))
+    app = new_app()
+    # A listed bank (static hit + local model / Cohere) lands on the full results page with appendix tables
+    classify_in_app(app, "ธนาคารกรุงไทย")
+    results[f"main_app rerun, results page n={size}"] = measure(lambda _: app.run(), range(APP_RERUNS), range(3))
+
+    if cold:
+        names = iter(synthetic_names(APP_RERUNS + 3, rng, suffix=" Logistics"))
+        first_paints = []
+        scenario = f"main_app classify new name (stub {latency * 1e3:.0f} ms) n={size}"
+        results[scenario] = measure(lambda _: first_paints.append(classify_in_app(app, next(names))), range(APP_RERUNS), range(3))
+        # The page renders before the AI answer arrives; this is how long the user waits for it
+        results[f"main_app first paint of a new name (stub {latency * 1e3:.0f} ms) n={size}"] = summarize(
+            first_paints[:APP_RERUNS], results[scenario]["peak_mib"])
+
+
+# --- Baselines ---
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"{'scenario':<58} | {'p50 ms':>9} | {'p95 ms':>9} | {'peak MiB':>8} | {'base p95':>9} | status")
+    for name, result in results.items():
+        base = baseline.get(name)
+        status = "new"
+        if base:
+            slow = result["p95_ms"] > base["p95_ms"] * tolerance + SLACK_MS
+            heavy = result["peak_mib"] > base["peak_mib"] * tolerance + SLACK_MIB
+            status = "REGRESSION" if slow or heavy else "ok"
+            if status != "ok":
+                regressions.append(name)
+        print(f"{name:<58} | {result['p50_ms']:>9.3f} | {result['p95_ms']:>9.3f} | {result['peak_mib']:>8.2f} | "
+              f"{base['p95_ms'] if base else float('nan'):>9.3f} | {status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="registry sizes to benchmark")
+    parser.add_argument("--quick", action="store_true", help="only the smallest registry size")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub Cohere latency per request (seconds)")
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="share of stub requests failing with a 503")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed ratio to the baseline p95 / memory")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any scenario regressed")
+    parser.add_argument("--update-baseline", action="store_true", help=f"write the results to {BASELINE_PATH}")
+    args = parser.parse_args(argv)
+    sizes = sorted(args.sizes)[:1] if args.quick else sorted(args.sizes)
+
+    rng = random.Random(42)
+    results = {}
+    bench_ai_paths(rng, results, args.latency, args.failure_rate)
+    bench_recommendations(results)
+    for size in sizes:
+        bench_registry(size, rng, results)
+        bench_main_app(size, rng, results, args.latency, cold=size == sizes[0])
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as handle:
+            baseline = json.load(handle).get("scenarios", {})
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        merged = dict(baseline, **results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as handle:
+            json.dump({"machine": f"{platform.platform()} / Python {platform.python_version()}", "scenarios": merged},
+                      handle, ensure_ascii=False, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+    if regressions:
+        print(f"{len(regressions)} scenario(s) regressed beyond {args.tolerance}x the baseline: {', '.join(regressions)}")
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
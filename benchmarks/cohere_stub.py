@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Deterministic offline stand-in for cohere.Client / cohere.AsyncClient.
+
+Answers the single-company and batched prompts of sector_core the way
+command-r-plus would, with configurable latency (a fixed part plus a part
+proportional to the tokens read and written), a rate of transient 503
+failures, and a rate of items silently dropped from batched answers.
+Sectors come from `truth` when given, else from name keywords, else from a
+hash of the name, so the same name always gets the same answer.
+
+install() puts the stubs in sys.modules["cohere"], so the real SDK is neither
+needed nor imported and nothing can reach the network.
+"""
+import json
+import random
+import sys
+import time
+import types
+import zlib
+
+import sector_core
+
+KEYWORD_SECTORS = [
+    (("ธนาคาร", "bank", "ประกัน", "insurance", "securities", "หลักทรัพย์"), "Banking / Finance / Insurance (BFSI)"),
+    (("โรงพยาบาล", "hospital", "clinic", "medical"), "Healthcare"),
+    (("software", "tech", "digital", "ดิจิทัล"), "Software / Tech / SaaS"),
+    (("logistics", "retail", "ขนส่ง"), "Retail / SME / Logistics"),
+    (("steel", "factory", "industr"), "Manufacturing / OT-heavy"),
+    (("การไฟฟ้า", "การประปา", "การท่าเรือ", "กองทัพ"), "Critical Infrastructure (CII)"),
+    (("กรม", "กระทรวง", "สำนักงาน", "มหาวิทยาลัย"), "Government / SOE"),
+]
+
+
+class StubServiceUnavailable(Exception):
+    """Looks like cohere's 503 error to resilience.is_transient."""
+    status_code = 503
+
+
+def stub_sector(name):
+    lowered = name.lower()
+    for keywords, sector in KEYWORD_SECTORS:
+        if any(keyword in lowered for keyword in keywords):
+            return sector
+    return sector_core.SECTOR_LABELS[zlib.crc32(name.encode("utf-8")) % len(sector_core.SECTOR_LABELS)]
+
+
+class StubCohere:
+    def __init__(self, latency=0.0, latency_per_input_token=0.0, latency_per_output_token=0.0, failure_rate=0.0,
+                 drop_rate=0.0, truth=None, seed=0):
+        self.latency = latency
+        self.latency_per_input_token = latency_per_input_token
+        self.latency_per_output_token = latency_per_output_token
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.truth = truth or {}
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def _sector(self, name):
+        return self.truth.get(name) or stub_sector(name)
+
+    def _answer(self, message):
+        """Returns (response text, seconds the real service would take), or raises a transient error."""
+        self.requests += 1
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise StubServiceUnavailable("503 Service Unavailable (stub)")
+        if "\nCompanies:\n" in message:
+            items = []
+            for line in message.rsplit("\nCompanies:\n", 1)[1].splitlines():
+                index, name = line.split(". ", 1)
+                if not (self.drop_rate and self.rng.random() < self.drop_rate):
+                    items.append({"index": int(index), "sector": self._sector(name), "reason": f"{name} looks like this sector."})
+            text = json.dumps(items, ensure_ascii=False)
+        else:
+            name = message.rsplit("Company: ", 1)[1]
+            text = json.dumps({"sector": self._sector(name), "reason": f"{name} looks like this sector."}, ensure_ascii=False)
+        input_tokens, output_tokens = sector_core.estimate_tokens(message), sector_core.estimate_tokens(text)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        delay = self.latency + input_tokens * self.latency_per_input_token + output_tokens * self.latency_per_output_token
+        meta = types.SimpleNamespace(billed_units=types.SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens))
+        return types.SimpleNamespace(text=text, meta=meta), delay
+
+    def chat(self, model=None, message="", temperature=None, max_tokens=None, request_options=None, **kwargs):
+        try:
+            response, delay = self._answer(message)
+        except StubServiceUnavailable:
+            time.sleep(self.latency)
+            raise
+        time.sleep(delay)
+        return response
+
+
+class AsyncStubCohere(StubCohere):
+    async def chat(self, model=None, message="", temperature=None, max_tokens=None, request_options=None, **kwargs):
+        import asyncio
+
+        try:
+            response, delay = self._answer(message)
+        except StubServiceUnavailable:
+            await asyncio.sleep(self.latency)
+            raise
+        await asyncio.sleep(delay)
+        return response
+
+
+def install(stub, async_stub=None):
+    """Makes `import cohere` return a module whose Client / AsyncClient are the given stubs."""
+    module = types.ModuleType("cohere")
+    module.Client = lambda *args, **kwargs: stub
+    module.AsyncClient = lambda *args, **kwargs: async_stub or AsyncStubCohere()
+    sys.modules["cohere"] = module
+    sector_core.get_client.cache_clear()
+    return module
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Resumable bulk classification of uploaded company lists.
+
+A job is identified by a hash of its input names and run options, so re-uploading
+the same file with the same options after a crash or a closed tab picks up where the previous run stopped. Every
+finished row is checkpointed to SQLite as soon as it completes; rows already
+in the store are never sent to the AI again. Rows whose AI call failed are not
+checkpointed and are retried on the next run.
+"""
+import csv
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from ai_cache import normalize_name
+
+DEFAULT_JOBS_PATH = os.environ.get("SECTOR_JOBS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bulk_jobs.sqlite3"))
+DEFAULT_CONCURRENCY = 8
+# Rows statically classified per worker-thread hop; small enough that the first AI calls start at once
+STATIC_CHUNK_ROWS = 500
+
+# Column headers we recognise as "the company name" in uploaded files, in priority order
+NAME_COLUMN_CANDIDATES = ["company", "company_name", "name", "organization", "organisation", "ชื่อ", "ชื่อบริษัท", "ชื่อหน่วยงาน"]
+
+RESULT_FIELDS = ["static_sector", "ai_sector", "ai_reason", "sector", "key_services", "regulators"]
+
+
+def job_id_for(names, options=None):
+    """Derives a stable job id from the ordered list of input names and the run options that change results."""
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(name.encode("utf-8"))
+        digest.update(b"\n")
+    # Re-running a file with other options is another job, not a resume of rows answered the old way
+    digest.update(repr(sorted((options or {}).items())).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def pick_name_column(columns):
+    """Returns the column most likely to hold company names, falling back to the first column."""
+    lowered = {str(col).strip().lower(): col for col in columns}
+    for candidate in NAME_COLUMN_CANDIDATES:
+        if candidate in lowered:
+            return lowered[candidate]
+    return columns[0] if len(columns) else None
+
+
+class BulkJobStore:
+    """SQLite checkpoint of per-row results, shared by every bulk job in the process."""
+
+    def __init__(self, path=DEFAULT_JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS bulk_rows (
+                   job_id TEXT NOT NULL,
+                   row_idx INTEGER NOT NULL,
+                   company_name TEXT NOT NULL,
+                   static_sector TEXT,
+                   ai_sector TEXT,
+                   ai_reason TEXT,
+                   sector TEXT,
+                   key_services TEXT,
+                   regulators TEXT,
+                   finished_at REAL NOT NULL,
+                   PRIMARY KEY (job_id, row_idx)
+               )"""
+        )
+
+    def finished_rows(self, job_id):
+        """Returns {row_idx: result dict} for every checkpointed row of a job."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT row_idx, company_name, {', '.join(RESULT_FIELDS)} FROM bulk_rows WHERE job_id = ?",
+                (job_id,),
+            ).fetchall()
+        return {row[0]: dict(zip(["company_name"] + RESULT_FIELDS, row[1:])) for row in rows}
+
+    def save_row(self, job_id, row_idx, company_name, result):
+        with self._lock:
+            self._conn.execute(
+                f"""INSERT OR REPLACE INTO bulk_rows
+                    (job_id, row_idx, company_name, {', '.join(RESULT_FIELDS)}, finished_at)
+                    VALUES (?, ?, ?, {', '.join('?' for _ in RESULT_FIELDS)}, ?)""",
+                (job_id, row_idx, company_name, *[result.get(f) for f in RESULT_FIELDS], time.time()),
+            )
+
+    def delete_job(self, job_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM bulk_rows WHERE job_id = ?", (job_id,))
+
+
+async def _run_rows(names, job_id, store, classify_static, classify_ai_async, enrich, on_result,
+                    concurrency, ai_for_static_hits):
+    import asyncio
+
+    done = store.finished_rows(job_id)
+    for row_idx, result in sorted(done.items()):
+        on_result(row_idx, result, True)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    # Duplicate names inside one file share a single AI call
+    in_flight = {}
+
+    async def ai_for(name):
+        key = normalize_name(name)
+        if key not in in_flight:
+            async def call():
+                async with semaphore:
+                    return await classify_ai_async(name)
+            in_flight[key] = asyncio.ensure_future(call())
+        return await in_flight[key]
+
+    async def process(row_idx, name, static_sector):
+        ai_sector, ai_reason = None, None
+        asks_ai = bool(name) and (static_sector is None or ai_for_static_hits)
+        if asks_ai:
+            ai_sector, ai_reason = await ai_for(name)
+        sector = static_sector or ai_sector
+        result = {"static_sector": static_sector, "ai_sector": ai_sector, "ai_reason": ai_reason, "sector": sector}
+        result.update(enrich(sector))
+        # A failed AI call is not checkpointed, so resuming the job retries it
+        if not (asks_ai and ai_sector is None and ai_reason is None):
+            store.save_row(job_id, row_idx, name, result)
+        result["company_name"] = name
+        on_result(row_idx, result, False)
+
+    def classify_chunk(chunk):
+        return [classify_static(name) for _, name in chunk]
+
+    # Static matching is CPU work: it runs in a worker thread, a chunk at a time, so the event loop
+    # keeps sending and receiving the AI calls of earlier rows meanwhile
+    pending = [(idx, name) for idx, name in enumerate(names) if idx not in done]
+    tasks = []
+    for start in range(0, len(pending), STATIC_CHUNK_ROWS):
+        chunk = pending[start:start + STATIC_CHUNK_ROWS]
+        static_sectors = await asyncio.to_thread(classify_chunk, chunk)
+        tasks += [asyncio.ensure_future(process(idx, name, static_sector))
+                  for (idx, name), static_sector in zip(chunk, static_sectors)]
+    await asyncio.gather(*tasks)
+
+
+def run_bulk_job(names, classify_static, classify_ai_async, enrich, store, on_result=None,
+                 concurrency=DEFAULT_CONCURRENCY, ai_for_static_hits=False, options=None):
+    """Classifies every name, resuming from the store, and returns the job id.
+
+    classify_static(name) -> sector or None (called from a worker thread), classify_ai_async(name) -> awaitable
+    (sector, reason), enrich(sector) -> dict of extra columns. on_result(row_idx,
+    result, resumed) is called once per row as results arrive. options holds the
+    caller's other settings that change results; they and ai_for_static_hits are
+    part of the job id.
+    """
+    # asyncio is imported here, not at module level, to keep the CLI's cold start small
+    import asyncio
+
+    job_id = job_id_for(names, dict(options or {}, ai_for_static_hits=ai_for_static_hits))
+    asyncio.run(_run_rows(
+        names, job_id, store, classify_static, classify_ai_async, enrich,
+        on_result or (lambda *args: None), concurrency, ai_for_static_hits,
+    ))
+    return job_id
+
+
+def write_enriched_csv(job_id, store, out_path, names, source_rows=None, source_columns=None):
+    """Writes every input row to CSV, next to the original columns if given, with the job's results added.
+
+    Rows the job has not finished (their AI call failed) keep blank result columns.
+    Returns how many rows had results.
+    """
+    done = store.finished_rows(job_id)
+    source_columns = list(source_columns or [])
+    fieldnames = source_columns + [c for c in ["company_name"] + RESULT_FIELDS if c not in source_columns]
+    # utf-8-sig so Excel opens Thai text correctly
+    with open(out_path, "w", newline="", encoding="utf-8-sig") as handle:
+        writer = csv.DictWriter(handle, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for row_idx, name in enumerate(names):
+            row = dict(source_rows[row_idx]) if source_rows is not None else {}
+            row["company_name"] = name
+            row.update(done.get(row_idx, {}))
+            writer.writerow(row)
+    return sum(1 for row_idx in done if row_idx < len(names))
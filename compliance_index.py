@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Precompiled index over the regulator compliance mapping CSVs.
+
+Built once from every mapping file, it answers the three questions the app
+asks: which regulator tables belong in the appendix for a set of sectors and
+an organization name (keywords of all regulators are matched in one automaton
+pass), what each table contains, and which regulator clauses call for a given
+service. The index remembers the files' mtimes so callers can rebuild it when
+a CSV changes.
+"""
+import csv
+import os
+import re
+from collections import namedtuple
+
+from fingerprint import file_signature
+from org_matcher import OrgMatcher
+
+# clause/topic/service columns name the CSV headers; level_column is optional (e.g. Mandatory / Recommended)
+ComplianceSource = namedtuple(
+    "ComplianceSource", ["regulator", "file_name", "clause_column", "topic_column", "service_column", "level_column"],
+    defaults=(None,),
+)
+RegulatorTable = namedtuple("RegulatorTable", ["regulator", "path", "columns", "rows", "error"])
+Clause = namedtuple("Clause", ["regulator", "clause", "topic", "level"])
+
+_SERVICE_SPLIT_RE = re.compile(r"[;\n]")
+
+
+def split_services(cell):
+    """Service names listed in one mapping cell, separated by semicolons or bullet lines."""
+    services = []
+    for part in _SERVICE_SPLIT_RE.split(cell or ""):
+        part = part.replace("🔹", "").strip()
+        if part:
+            services.append(part)
+    return services
+
+
+def read_table(regulator, path):
+    """Reads one mapping CSV into a RegulatorTable; a missing or unreadable file yields no rows and an error."""
+    if not os.path.exists(path):
+        return RegulatorTable(regulator, path, [], [], "missing")
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.reader(handle)
+            columns = next(reader, [])
+            rows = [row for row in reader if any(cell.strip() for cell in row)]
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        return RegulatorTable(regulator, path, [], [], str(e))
+    return RegulatorTable(regulator, path, columns, rows, None)
+
+
+class ComplianceIndex:
+    """sector -> regulator -> requirement rows, service -> clauses, and keyword -> regulator.
+
+    sector_tables maps a sector to the regulators whose tables it shows; regulators that also appear
+    in regulator_keywords are shown only when the organization name contains one of their keywords.
+    """
+
+    def __init__(self, sources, sector_tables, regulator_keywords, base_dir="."):
+        self.sources = {source.regulator: source for source in sources}
+        self._order = {source.regulator: rank for rank, source in enumerate(sources)}
+        paths = [os.path.join(base_dir, source.file_name) for source in sources]
+        self.signature = file_signature(paths)
+        self.tables = {}
+        # casefolded service name -> (service name as written, [Clause])
+        self._services = {}
+        for source, path in zip(sources, paths):
+            table = read_table(source.regulator, path)
+            self.tables[source.regulator] = table
+            self._index_services(source, table)
+
+        self.sector_tables = {sector: tuple(regulators) for sector, regulators in sector_tables.items()}
+        self._keyword_matcher = OrgMatcher(list(regulator_keywords.items()))
+        self._gated = set(regulator_keywords)
+
+    def _index_services(self, source, table):
+        position = {column: i for i, column in enumerate(table.columns)}
+
+        def cell(row, column):
+            i = position.get(column)
+            return row[i].strip() if i is not None and i < len(row) else ""
+
+        for row in table.rows:
+            clause = Clause(source.regulator, cell(row, source.clause_column), cell(row, source.topic_column),
+                            cell(row, source.level_column) or None)
+            for service in split_services(cell(row, source.service_column)):
+                _, clauses = self._services.setdefault(service.casefold(), (service, []))
+                if clause not in clauses:
+                    clauses.append(clause)
+
+    def is_stale(self):
+        """True when any mapping CSV was added, removed or modified since the index was built."""
+        return file_signature(path for path, _ in self.signature) != self.signature
+
+    def regulators_named_in(self, org_name):
+        """Keyword-gated regulators whose keywords occur in the name, in one pass over it."""
+        return {label for labels in self._keyword_matcher.match(org_name).values() for label in labels}
+
+    def appendix(self, sectors, org_name=""):
+        """Regulator tables to show for these sectors and this organization, in source order."""
+        named = None
+        regulators = set()
+        for sector in sectors:
+            for regulator in self.sector_tables.get(sector, ()):
+                if regulator in self._gated:
+                    if named is None:
+                        named = self.regulators_named_in(org_name)
+                    if regulator not in named:
+                        continue
+                regulators.add(regulator)
+        return [self.tables[regulator] for regulator in sorted(regulators, key=self._order.get)]
+
+    def service_names(self):
+        return sorted(name for name, _ in self._services.values())
+
+    def clauses_for_service(self, service):
+        """Every regulator clause whose mapping lists this service (exact name, case-insensitive)."""
+        entry = self._services.get(service.strip().casefold())
+        return list(entry[1]) if entry else []
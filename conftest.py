@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Shared test setup: throwaway on-disk stores, and Cohere replaced by benchmarks/cohere_stub.py."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+# Set before sector_core is imported, so no test touches the real cache, job store or snapshot
+WORK_DIR = tempfile.mkdtemp(prefix="sector_tests_")
+os.environ["SECTOR_CACHE_PATH"] = os.path.join(WORK_DIR, "ai_cache.sqlite3")
+os.environ["SECTOR_JOBS_PATH"] = os.path.join(WORK_DIR, "bulk_jobs.sqlite3")
+os.environ["SECTOR_REGISTRY_SNAPSHOT"] = os.path.join(WORK_DIR, "registry.snapshot")
+
+
+@pytest.fixture
+def cohere(monkeypatch):
+    """A fresh StubCohere behind sector_core, with an empty AI cache, a closed breaker and no backoff sleeps."""
+    import cohere_stub
+    import resilience
+    import sector_core
+
+    stub = cohere_stub.StubCohere()
+    monkeypatch.delitem(sys.modules, "cohere", raising=False)
+    monkeypatch.setattr(sector_core, "_api_key", "offline-stub")
+    cohere_stub.install(stub)
+    monkeypatch.setattr(sector_core, "AI_BREAKER", resilience.CircuitBreaker(failure_threshold=5, recovery_timeout=30.0))
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+    sector_core.get_ai_cache().clear()
+    sector_core.get_ai_scheduler.cache_clear()
+    yield stub
+    sector_core.get_client.cache_clear()
+    sector_core.get_ai_scheduler.cache_clear()
+    sector_core.get_ai_cache().clear()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Change detection for the files compiled indexes are built from.
+
+file_signature() is cheap enough to poll on every request; file_digest()
+reads the files and is used where a stale build must never be reused.
+"""
+import hashlib
+import os
+
+
+def file_signature(paths):
+    """(path, mtime_ns) for each path; None for files that do not exist."""
+    signature = []
+    for path in paths:
+        try:
+            signature.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            signature.append((path, None))
+    return tuple(signature)
+
+
+def file_digest(paths, salt=""):
+    """SHA-256 hex digest over salt and the base name and contents of each path; missing files count too."""
+    digest = hashlib.sha256(salt.encode())
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        try:
+            with open(path, "rb") as handle:
+                digest.update(handle.read())
+        except OSError:
+            digest.update(b"\0missing")
+    return digest.hexdigest()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Local nearest-neighbour sector classifier over character n-grams.
+
+Names are turned into TF-IDF weighted character n-gram vectors (which copes
+with Thai text having no word boundaries) and compared by cosine similarity
+against past classifications through an inverted index. n-grams shared by
+very many examples are skipped when gathering candidates, and the best
+candidates are then scored exactly, so prediction stays fast as the cache grows.
+The sector is a similarity-weighted vote of the nearest neighbours, returned
+with a confidence so callers can decide when to fall back to the LLM.
+"""
+import math
+import random
+from collections import namedtuple
+
+from org_matcher import normalize_org_name
+
+NGRAM_SIZES = (2, 3, 4)
+DEFAULT_NEIGHBOURS = 5
+# n-grams in more examples than this carry little signal; their postings are skipped when gathering candidates
+KNN_MAX_POSTING = 1000
+# Candidates re-scored with the exact cosine when postings were skipped
+KNN_CANDIDATES = 50
+
+Prediction = namedtuple("Prediction", ["sector", "confidence", "neighbours"])
+
+
+def char_ngrams(name):
+    """Counts of the character n-grams of a normalized, space-padded name."""
+    text = f" {normalize_org_name(name)} "
+    counts = {}
+    for size in NGRAM_SIZES:
+        for start in range(len(text) - size + 1):
+            gram = text[start:start + size]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class KnnClassifier:
+    """Cosine kNN over TF-IDF character n-gram vectors.
+
+    Examples are (name, sector, weight) triples; weight scales an example's
+    vote, e.g. to let confirmed answers outrank weaker labels.
+    """
+
+    def __init__(self, examples, k=DEFAULT_NEIGHBOURS):
+        self.k = k
+        self.names, self.sectors, self.weights = [], [], []
+        seen = set()
+        doc_grams = []
+        for name, sector, weight in examples:
+            key = normalize_org_name(name)
+            if not key or not sector or key in seen:
+                continue
+            seen.add(key)
+            self.names.append(name)
+            self.sectors.append(sector)
+            self.weights.append(weight)
+            doc_grams.append(char_ngrams(name))
+
+        document_frequency = {}
+        for grams in doc_grams:
+            for gram in grams:
+                document_frequency[gram] = document_frequency.get(gram, 0) + 1
+        total = len(doc_grams)
+        self._idf = {gram: math.log((1 + total) / (1 + df)) + 1 for gram, df in document_frequency.items()}
+
+        # gram -> [(doc id, normalized weight)]
+        self._postings = {}
+        for doc_id, grams in enumerate(doc_grams):
+            for gram, weight in self._vectorize(grams).items():
+                self._postings.setdefault(gram, []).append((doc_id, weight))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _vectorize(self, grams):
+        """Sublinear TF * IDF, L2-normalized. n-grams unseen in training are dropped."""
+        vector = {}
+        for gram, count in grams.items():
+            idf = self._idf.get(gram)
+            if idf:
+                vector[gram] = (1 + math.log(count)) * idf
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {gram: w / norm for gram, w in vector.items()} if norm else {}
+
+    def _top(self, name, k):
+        """[(doc id, cosine similarity)] of the k examples most similar to name."""
+        query = self._vectorize(char_ngrams(name))
+        scores = {}
+        skipped = False
+        # Rarest n-grams first; the common ones only add a little to every candidate
+        for gram in sorted(query, key=lambda gram: len(self._postings.get(gram, ()))):
+            posting = self._postings.get(gram, ())
+            if len(posting) > KNN_MAX_POSTING and scores:
+                skipped = True
+                break
+            query_weight = query[gram]
+            for doc_id, doc_weight in posting:
+                scores[doc_id] = scores.get(doc_id, 0.0) + query_weight * doc_weight
+        if skipped:
+            candidates = sorted(scores, key=scores.get, reverse=True)[:KNN_CANDIDATES]
+            scores = {doc_id: self._cosine(query, doc_id) for doc_id in candidates}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def _cosine(self, query, doc_id):
+        vector = self._vectorize(char_ngrams(self.names[doc_id]))
+        return sum(weight * vector.get(gram, 0.0) for gram, weight in query.items())
+
+    def neighbours(self, name, k=None):
+        """Returns [(example name, sector, cosine similarity)] of the k most similar examples."""
+        return [(self.names[doc_id], self.sectors[doc_id], similarity) for doc_id, similarity in self._top(name, k or self.k)]
+
+    def predict(self, name):
+        """Returns a Prediction, or None when no example shares any n-gram with the name.
+
+        confidence = (winning sector's share of the weighted vote) * (best neighbour's similarity),
+        so it is high only when the neighbours agree and are genuinely close.
+        """
+        top = self._top(name, self.k)
+        if not top:
+            return None
+        votes = {}
+        for doc_id, similarity in top:
+            votes[self.sectors[doc_id]] = votes.get(self.sectors[doc_id], 0.0) + similarity * self.weights[doc_id]
+        total = sum(votes.values())
+        if total <= 0:
+            return None
+        sector = max(votes, key=votes.get)
+        best_similarity = max(similarity for doc_id, similarity in top if self.sectors[doc_id] == sector)
+        confidence = votes[sector] / total * min(best_similarity, 1.0)
+        neighbours = [(self.names[doc_id], self.sectors[doc_id], round(similarity, 3)) for doc_id, similarity in top]
+        return Prediction(sector, round(confidence, 3), neighbours)
+
+
+def evaluate(labelled, background=(), thresholds=(0.5, 0.6, 0.7, 0.8, 0.9), holdout=0.2, seed=0):
+    """Held-out evaluation of the local model against LLM labels.
+
+    labelled is [(name, sector)] from the LLM; a random `holdout` fraction is
+    predicted by a model trained on the rest plus any `background` examples
+    ((name, sector, weight)). For every threshold,
+    returns how many held-out names the model would answer without the LLM
+    (the call reduction) and how often those answers agree with the LLM.
+    """
+    labelled = list(labelled)
+    random.Random(seed).shuffle(labelled)
+    split = max(1, int(len(labelled) * holdout)) if labelled else 0
+    held_out, train = labelled[:split], labelled[split:]
+    model = KnnClassifier([(name, sector, 1.0) for name, sector in train] + list(background))
+    predictions = [(model.predict(name), sector) for name, sector in held_out]
+
+    report = {"train_size": len(model), "holdout_size": len(held_out), "thresholds": []}
+    for threshold in thresholds:
+        answered = [(p, truth) for p, truth in predictions if p is not None and p.confidence >= threshold]
+        agreed = sum(1 for p, truth in answered if p.sector == truth)
+        report["thresholds"].append({
+            "threshold": threshold,
+            "llm_call_reduction": len(answered) / len(held_out) if held_out else 0.0,
+            "agreement": agreed / len(answered) if answered else None,
+        })
+    return report
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""In-process metrics: stage latency histograms and labelled counters.
+
+Metrics keeps cumulative histograms and counters for Prometheus text
+exposition, and a rolling window of raw latencies for the in-app metrics
+page. Optionally every observation is also appended to a JSON-lines log by a
+writer thread, so callers never wait on disk I/O, and serve_prometheus()
+exposes /metrics over HTTP from a daemon thread, so nothing beyond the
+standard library or an external collector is needed.
+"""
+import bisect
+import contextlib
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROLLING_WINDOW_SECONDS = 15 * 60
+ROLLING_MAX_SAMPLES = 10_000
+PROMETHEUS_PREFIX = "sector_"
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """Thread-safe stage timings (seconds) and counters, shared by every session of the process."""
+
+    def __init__(self, log_path=None, buckets=LATENCY_BUCKETS, window=ROLLING_WINDOW_SECONDS, clock=time.time):
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.log_path = log_path
+        self.log_error = None
+        self.exporter_address = None
+        self.exporter_error = None
+        # Callables returning {gauge name: value}, read at exposition time (e.g. queue depth)
+        self.gauge_sources = []
+        self._clock = clock
+        self._lock = threading.Lock()
+        # stage -> [per-bucket counts (last one is +Inf), sum, count]
+        self._histograms = {}
+        self._recent = {}
+        self._counters = {}
+        self._log_queue = None
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._recent[stage] = deque(maxlen=ROLLING_MAX_SAMPLES)
+            histogram[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            now = self._clock()
+            self._recent[stage].append((now, seconds))
+        self._log({"ts": now, "type": "span", "stage": stage, "seconds": round(seconds, 6)})
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        """Times the block as one observation of `stage`, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        if amount:
+            self._log({"ts": self._clock(), "type": "counter", "name": name, "amount": amount, "labels": labels})
+
+    def total(self, name, **labels):
+        """Sum of a counter over every label set that includes the given labels."""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(value for (counter, pairs), value in self._counters.items()
+                       if counter == name and wanted <= set(pairs))
+
+    def counters(self, name):
+        """{labels dict as a sorted tuple: value} for one counter."""
+        with self._lock:
+            return {pairs: value for (counter, pairs), value in self._counters.items() if counter == name}
+
+    def stages(self):
+        with self._lock:
+            return sorted(self._histograms)
+
+    def rolling(self, stage):
+        """Latencies (seconds) of a stage observed within the rolling window, oldest first."""
+        cutoff = self._clock() - self.window
+        with self._lock:
+            return [seconds for at, seconds in self._recent.get(stage, ()) if at >= cutoff]
+
+    def bucket_counts(self, samples):
+        """[(upper bound or None for +Inf, count)] of samples, non-cumulative."""
+        counts = [0] * (len(self.buckets) + 1)
+        for seconds in samples:
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        return list(zip(list(self.buckets) + [None], counts))
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            histograms = {stage: ([list(h[0]), h[1], h[2]]) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+        name = f"{PROMETHEUS_PREFIX}stage_seconds"
+        lines += [f"# HELP {name} Latency of each processing stage.", f"# TYPE {name} histogram"]
+        for stage, (counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        for counter in sorted({counter for counter, _ in counters}):
+            full = f"{PROMETHEUS_PREFIX}{counter}_total"
+            lines += [f"# TYPE {full} counter"]
+            for (other, pairs), value in sorted(counters.items()):
+                if other == counter:
+                    lines.append(f"{full}{_format_labels(pairs)} {value}")
+        for source in self.gauge_sources:
+            for gauge, value in sorted(source().items()):
+                full = f"{PROMETHEUS_PREFIX}{gauge}"
+                lines += [f"# TYPE {full} gauge", f"{full} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def _log(self, record):
+        if not self.log_path or self.log_error:
+            return
+        if self._log_queue is None:
+            with self._lock:
+                if self._log_queue is None:
+                    self._log_queue = queue.SimpleQueue()
+                    threading.Thread(target=self._write_log, name="metrics-log", daemon=True).start()
+        self._log_queue.put(record)
+
+    def _write_log(self):
+        """Appends queued records through one open handle, flushing whenever the queue runs dry."""
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as handle:
+                while True:
+                    record = self._log_queue.get()
+                    handle.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    if self._log_queue.empty():
+                        handle.flush()
+        except OSError as e:
+            self.log_error = str(e)
+
+
+def serve_prometheus(metrics, port, host="127.0.0.1"):
+    """Serves metrics.to_prometheus() at http://host:port/metrics from a daemon thread; returns the server."""
+    # http.server is imported here, not at module level: it is a good share of the CLI's cold start
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    metrics.exporter_address = f"http://{host}:{server.server_address[1]}/metrics"
+    return server
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""Precompiled matchers over the static organization registries.
+
+OrgMatcher is an Aho-Corasick automaton: it finds every registry name contained
+in an input string in a single pass over that string, independent of how many
+names are registered. SuggestionIndex answers "which names contain this
+keyword" from a character n-gram inverted index instead of scanning the list,
+and FuzzyIndex extends it with typo-tolerant, ranked search over names and
+their aliases. All of them are built once and then only read, so they are safe
+to share across Streamlit sessions, and they keep their bulk in flat integer
+arrays so a compiled registry snapshot (registry.py) pickles and loads fast.
+"""
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+
+from ai_cache import normalize_name
+
+SUGGESTION_NGRAM = 2
+# Candidates re-scored with edit distance per fuzzy query; bounds latency at registry scale
+FUZZY_CANDIDATES = 30
+# n-grams shared by more names than this carry little signal and are skipped when gathering candidates
+FUZZY_MAX_POSTING = 5000
+FUZZY_MIN_SIMILARITY = 0.7
+# Minimum similarity for classify-time near-miss matching, and the shortest name it is tried on
+NEAR_MISS_SIMILARITY = 0.88
+NEAR_MISS_MIN_LENGTH = 6
+
+# Corporate affixes that say nothing about which organization a name refers to
+_THAI_AFFIXES = [normalize_name(a) for a in ["บริษัท", "จำกัด", "มหาชน", "บมจ", "บจก", "หจก", "ห้างหุ้นส่วน"]]
+_LATIN_AFFIXES = {"co", "company", "ltd", "limited", "plc", "pcl", "public", "inc", "corp", "corporation", "the"}
+
+
+def normalize_org_name(name):
+    """normalize_name() plus removal of corporate affixes such as บริษัท / จำกัด (มหาชน) / Co., Ltd."""
+    text = normalize_name(name)
+    for affix in _THAI_AFFIXES:
+        text = text.replace(affix, " ")
+    return normalize_name(" ".join(token for token in text.split() if token not in _LATIN_AFFIXES))
+
+
+def substring_distance(pattern, text, max_distance=None):
+    """Fewest edits that turn pattern into some substring of text (Sellers' algorithm).
+
+    Returns max_distance + 1 as soon as the distance is known to exceed max_distance.
+    """
+    if not pattern:
+        return 0
+    previous = [0] * (len(text) + 1)
+    for i, pattern_char in enumerate(pattern, 1):
+        current = [i]
+        for j, text_char in enumerate(text, 1):
+            current.append(min(
+                previous[j - 1] + (pattern_char != text_char),
+                previous[j] + 1,
+                current[j - 1] + 1,
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous)
+
+
+class OrgMatcher:
+    """Multi-pattern substring matcher mapping registry names to the lists they belong to.
+
+    The automaton lives in flat integer arrays (a double-array trie with failure and output
+    links), so a matcher over 100k+ names is compact and unpickles in milliseconds.
+    """
+
+    def __init__(self, labelled_lists):
+        """labelled_lists is an ordered sequence of (label, names); earlier labels win in classify()."""
+        self.labels = [label for label, _ in labelled_lists]
+        self._priority = {label: rank for rank, label in enumerate(self.labels)}
+        # pattern (lowercased) -> (original name, [labels])
+        patterns = {}
+        for label, names in labelled_lists:
+            for name in names:
+                key = name.lower()
+                if not key:
+                    continue
+                _, labels = patterns.setdefault(key, (name, []))
+                if label not in labels:
+                    labels.append(label)
+        # Pattern id -> original name and labels; equal label tuples are shared
+        shared = {}
+        self._names = []
+        self._pattern_labels = []
+        for name, labels in patterns.values():
+            labels = tuple(labels)
+            self._names.append(name)
+            self._pattern_labels.append(shared.setdefault(labels, labels))
+        self._build(list(patterns))
+
+    def _build(self, keys):
+        # Plain trie first: dict transitions and the pattern id ending at each node
+        goto, terminal = [{}], [-1]
+        for pattern_id, key in enumerate(keys):
+            node = 0
+            for ch in key:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    terminal.append(-1)
+                node = nxt
+            terminal[node] = pattern_id
+
+        # Failure links breadth-first; out_link points at the nearest proper suffix that ends a pattern
+        fail, out_link, order = [0] * len(goto), [-1] * len(goto), [0]
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for ch, child in goto[node].items():
+                queue.append(child)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[child] = target if target != child else 0
+            f = fail[node]
+            out_link[node] = f if terminal[f] >= 0 else out_link[f]
+
+        # Dense character codes, most frequent first, keep the arrays short
+        frequency = Counter(ch for edges in goto for ch in edges)
+        self._codes = {ch: code for code, (ch, _) in enumerate(frequency.most_common(), 1)}
+        max_code = len(self._codes)
+
+        # Double array: a node's child for code c sits in slot base[node] + c, and check[slot] is the parent slot
+        slot = [0] * len(goto)
+        base, check, used = [0], [-1], bytearray(b"\1")
+
+        def reserve(limit):
+            if limit >= len(used):
+                extra = max(limit + 1 - len(used), len(used))
+                base.extend([0] * extra)
+                check.extend([-1] * extra)
+                used.extend(bytes(extra))
+
+        codes = self._codes
+        first_free = 1
+        for node in order:
+            edges = goto[node]
+            if not edges:
+                continue
+            children = sorted((codes[ch], child) for ch, child in edges.items())
+            first_free = used.find(0, first_free)
+            if first_free < 0:
+                first_free = len(used)
+            # The first child goes into a free slot; the others must land on free slots too
+            lowest = children[0][0]
+            position = used.find(0, max(first_free, lowest))
+            while True:
+                if position < 0:
+                    position = len(used)
+                offset = position - lowest
+                reserve(offset + children[-1][0])
+                if len(children) == 1 or not any(used[offset + code] for code, _ in children[1:]):
+                    break
+                position = used.find(0, position + 1)
+            base[slot[node]] = offset
+            for code, child in children:
+                used[offset + code] = 1
+                check[offset + code] = slot[node]
+                slot[child] = offset + code
+
+        # Trim to the last used slot plus room for any code, so base[node] + code never runs off the end
+        size = max(slot) + max_code + 1
+        reserve(size)
+        self._base = array("i", base[:size])
+        self._check = array("i", check[:size])
+        self._fail = array("i", [0]) * size
+        self._out = array("i", [-1]) * size
+        self._out_link = array("i", [-1]) * size
+        for node, node_slot in enumerate(slot):
+            self._fail[node_slot] = slot[fail[node]]
+            self._out[node_slot] = terminal[node]
+            if out_link[node] >= 0:
+                self._out_link[node_slot] = slot[out_link[node]]
+
+    def __len__(self):
+        return len(self._names)
+
+    def match(self, text):
+        """Returns {registry name: [labels]} for every registry name contained in text."""
+        found = {}
+        if not text:
+            return found
+        codes, base, check, fail, out, out_link = (
+            self._codes, self._base, self._check, self._fail, self._out, self._out_link)
+        node = 0
+        for ch in text.lower():
+            code = codes.get(ch)
+            if code is None:
+                # No registry name contains this character
+                node = 0
+                continue
+            while True:
+                nxt = base[node] + code
+                if check[nxt] == node:
+                    node = nxt
+                    break
+                if not node:
+                    break
+                node = fail[node]
+            hit = node if out[node] >= 0 else out_link[node]
+            while hit >= 0:
+                found[out[hit]] = None
+                hit = out_link[hit]
+        return {self._names[pattern]: list(self._pattern_labels[pattern]) for pattern in found}
+
+    def classify(self, text):
+        """Returns the highest-priority label among all registry names found in text, or None."""
+        best = None
+        for labels in self.match(text).values():
+            for label in labels:
+                if best is None or self._priority[label] < self._priority[best]:
+                    best = label
+        return best
+
+
+class SuggestionIndex:
+    """Substring search over a fixed list of names via a character n-gram inverted index."""
+
+    def __init__(self, names, n=SUGGESTION_NGRAM):
+        self.n = n
+        self.names = list(names)
+        # Reuse the name itself when it is already lower case, so the two lists share strings
+        self._lowered = []
+        for name in self.names:
+            lowered = name.lower()
+            self._lowered.append(name if lowered == name else lowered)
+        postings = {}
+        for idx, lowered in enumerate(self._lowered):
+            for gram in self._grams(lowered):
+                postings.setdefault(gram, []).append(idx)
+        # Integer arrays rather than lists: a fraction of the memory, and they pickle as flat buffers
+        self._postings = {gram: array("i", ids) for gram, ids in postings.items()}
+
+    def _grams(self, text):
+        """Every distinct substring of length 1..n of text."""
+        grams = set()
+        for size in range(1, self.n + 1):
+            for start in range(len(text) - size + 1):
+                grams.add(text[start:start + size])
+        return grams
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, keyword, limit=None):
+        """Returns names containing keyword (case-insensitive), in the order they were indexed."""
+        if not keyword:
+            return []
+        return [self.names[idx] for idx in self._search_ids(keyword.lower(), limit)]
+
+    def _substring_candidates(self, keyword_lower):
+        """Ids of the names that may contain keyword_lower, in posting order; callers still verify them."""
+        if len(keyword_lower) <= self.n:
+            return self._postings.get(keyword_lower, ())
+        # Only names holding the keyword's rarest n-gram can contain it
+        grams = {keyword_lower[i:i + self.n] for i in range(len(keyword_lower) - self.n + 1)}
+        return min((self._postings.get(gram, ()) for gram in grams), key=len)
+
+    def _search_ids(self, keyword_lower, limit=None):
+        results = []
+        for idx in self._substring_candidates(keyword_lower):
+            if keyword_lower in self._lowered[idx]:
+                results.append(idx)
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+
+class FuzzyIndex(SuggestionIndex):
+    """Ranked, typo-tolerant search over organization names and their aliases.
+
+    Every official name and alias is indexed as a normalized surface form pointing
+    at its official name, so "kbank", "ธปท" or a misspelt "กรมควบคมโรค" resolve to
+    the listed organization.
+    """
+
+    def __init__(self, names, aliases=None, n=SUGGESTION_NGRAM):
+        surfaces, targets = [], []
+        self._aliases = {}
+        # Upper-case Latin aliases (BOT, SCB) only count when written in upper case: "Bot Solutions" is not BOT
+        self._acronyms = {}
+        for name in names:
+            surface = sys.intern(normalize_org_name(name))
+            if surface:
+                surfaces.append(surface)
+                targets.append(name)
+        # Official names come first, aliases after
+        self._name_surfaces = range(len(surfaces))
+        for name, alias_list in (aliases or {}).items():
+            for alias in alias_list:
+                surface = sys.intern(normalize_org_name(alias))
+                if surface:
+                    self._aliases[surface] = name
+                    if alias.isascii() and alias.isupper():
+                        self._acronyms[surface] = re.compile(rf"(?<![A-Za-z]){re.escape(alias)}(?![A-Za-z])")
+                    surfaces.append(surface)
+                    targets.append(name)
+        super().__init__(surfaces, n=n)
+        self.targets = targets
+        # Postings shortest surface first (ties by official name), so ranked_search can stop after k hits
+        order = sorted(range(len(surfaces)), key=lambda idx: (len(surfaces[idx]), targets[idx]))
+        rank = array("i", [0]) * len(order)
+        for position, idx in enumerate(order):
+            rank[idx] = position
+        self._postings = {gram: array("i", sorted(ids, key=rank.__getitem__)) for gram, ids in self._postings.items()}
+        # Surface ids in string order: the surfaces starting with a query are one contiguous run
+        self._sorted_ids = array("i", sorted(range(len(surfaces)), key=surfaces.__getitem__))
+
+    def _grams_of(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def _candidates(self, query, only=None):
+        """(surface id, shared n-gram count) for the surfaces sharing the most n-grams with query."""
+        postings = sorted((self._postings.get(gram, ()) for gram in self._grams_of(query)), key=len)
+        counts = {}
+        for posting in postings:
+            if len(posting) > FUZZY_MAX_POSTING and counts:
+                break
+            for idx in posting:
+                if only is None or idx in only:
+                    counts[idx] = counts.get(idx, 0) + 1
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:FUZZY_CANDIDATES]
+
+    def ranked_search(self, query, k=10):
+        """Returns up to k (official name, score) pairs, best first.
+
+        Exact substring hits score 0.95-1.0 (prefix hits highest); typo-tolerant
+        hits score below 0.9 in proportion to how few edits the query needs.
+        """
+        q = normalize_org_name(query)
+        if not q:
+            return []
+        ranked = self._substring_hits(q, k)
+        if len(q) > self.n and len(ranked) < k:
+            found = {target for target, _ in ranked}
+            best = {}
+            max_distance = int(len(q) * (1 - FUZZY_MIN_SIMILARITY))
+            # Each edit breaks at most n of the query's n-grams, so weaker candidates cannot qualify
+            min_shared = len(self._grams_of(q)) - self.n * max_distance
+            for idx, shared in self._candidates(q):
+                target = self.targets[idx]
+                if shared < min_shared or target in found:
+                    continue
+                distance = substring_distance(q, self.names[idx], max_distance)
+                if distance <= max_distance:
+                    key = (-round(0.9 * (1 - distance / len(q)), 3), len(self.names[idx]), target)
+                    best[target] = min(key, best.get(target, key))
+            ranked += [(target, -score) for score, _, target in sorted(best.values())]
+        return ranked[:k]
+
+    def _prefix_count(self, q):
+        """How many surfaces start with q."""
+        names = self.names
+        first = bisect_left(self._sorted_ids, q, key=names.__getitem__)
+        last = bisect_right(self._sorted_ids, q, lo=first, key=lambda idx: names[idx][:len(q)])
+        return last - first
+
+    def _substring_hits(self, q, k):
+        """Up to k (official name, score) for surfaces containing q: prefix hits first, each group shortest first.
+
+        Postings are in rank order, so the scan stops as soon as no later surface can make the top k.
+        """
+        prefixes_left = self._prefix_count(q)
+        prefix, other = {}, {}
+        for idx in self._substring_candidates(q):
+            surface = self.names[idx]
+            if q not in surface:
+                continue
+            target = self.targets[idx]
+            if surface.startswith(q):
+                prefixes_left -= 1
+                prefix.setdefault(target, None)
+                other.pop(target, None)
+                if len(prefix) >= k:
+                    break
+            elif target not in prefix:
+                other.setdefault(target, None)
+            if not prefixes_left and len(prefix) + len(other) >= k:
+                break
+        return [(target, 1.0) for target in prefix] + [(target, 0.95) for target in other]
+
+    def alias_match(self, text):
+        """The organization a name that is just one of its aliases (plus corporate affixes) stands for, or None.
+
+        A dict lookup, so it costs the same at any registry size.
+        """
+        t = normalize_org_name(text)
+        # An alias only stands for the organization on its own: "Krungthai AXA" or "KTB Law" are other companies
+        target = self._aliases.get(t) if t else None
+        if target and (t not in self._acronyms or self._acronyms[t].search(text)):
+            return target
+        return None
+
+    def best_match(self, text, threshold=NEAR_MISS_SIMILARITY):
+        """Finds the organization a full name most likely refers to, or None.
+
+        Used after exact matching fails: a name that is just an alias plus corporate
+        affixes, or an official name found in text with at most a few typos. The typo
+        pass re-scores candidates with edit distance, so it is for single lookups only.
+        """
+        target = self.alias_match(text)
+        if target:
+            return target, 1.0
+        t = normalize_org_name(text)
+        if not t:
+            return None
+        best = None
+        for idx, shared in self._candidates(t, only=self._name_surfaces):
+            surface = self.names[idx]
+            if len(surface) < NEAR_MISS_MIN_LENGTH:
+                continue
+            max_distance = int(len(surface) * (1 - threshold))
+            if shared < len(self._grams_of(surface)) - self.n * max_distance:
+                continue
+            similarity = 1 - substring_distance(surface, t, max_distance) / len(surface)
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (self.targets[idx], round(similarity, 3))
+        return best
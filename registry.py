@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Organization / sector registry compiled from versioned data files.
+
+The NCSA lists, organization aliases, regulator keywords and sector details
+live in registry/ as plain CSV and JSON, so updating them is a data change
+rather than a code deploy:
+
+    manifest.json            version, and the precedence of the NCSA lists
+    sectors.json             sector -> services, regulators, compliance drivers
+    organizations.csv        sector,name    (one row per listed organization)
+    aliases.csv              name,alias     (abbreviations, English names)
+    regulator_keywords.csv   regulator,keyword
+
+compile_registry() validates the files and turns them into a Registry:
+names de-duplicated, whitespace- and Unicode-normalized and interned, with
+the OrgMatcher automaton and FuzzyIndex prebuilt. save_snapshot() pickles the
+result and load_registry() reuses a snapshot whose source hash still matches
+the files and the matcher code, which turns seconds of compiling at 100k+
+organizations into one unpickle. Snapshots are pickles: only load ones this code wrote.
+"""
+import csv
+import gc
+import json
+import os
+import pickle
+import re
+import sys
+import unicodedata
+
+import ai_cache
+import org_matcher
+from fingerprint import file_digest, file_signature
+from org_matcher import FuzzyIndex, OrgMatcher
+
+REGISTRY_FILES = ("manifest.json", "sectors.json", "organizations.csv", "aliases.csv", "regulator_keywords.csv")
+# The modules whose code builds the pickled objects; editing any of them invalidates old snapshots
+SNAPSHOT_CODE_FILES = (os.path.abspath(__file__), os.path.abspath(org_matcher.__file__), os.path.abspath(ai_cache.__file__))
+# Bump when the snapshot envelope itself changes
+SNAPSHOT_FORMAT = 2
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class RegistryError(ValueError):
+    """A registry data file is missing or inconsistent."""
+
+
+def clean_name(text):
+    """NFC-normalized, whitespace-collapsed and interned; '' for blank cells."""
+    text = _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+    return sys.intern(text) if text else ""
+
+
+def source_hash(data_dir):
+    """SHA-256 over every registry data file and the code that builds the Registry."""
+    paths = [os.path.join(data_dir, file_name) for file_name in REGISTRY_FILES] + list(SNAPSHOT_CODE_FILES)
+    return file_digest(paths, salt=f"format {SNAPSHOT_FORMAT}")
+
+
+def data_signature(data_dir):
+    """(path, mtime_ns) of every registry data file; cheap enough to poll."""
+    return file_signature(os.path.join(data_dir, file_name) for file_name in REGISTRY_FILES)
+
+
+def _read_json(data_dir, file_name):
+    path = os.path.join(data_dir, file_name)
+    try:
+        with open(path, encoding="utf-8-sig") as handle:
+            return json.load(handle)
+    except (OSError, ValueError) as e:
+        raise RegistryError(f"{path}: {e}") from e
+
+
+def read_sector_details(data_dir):
+    """sectors.json as an ordered {sector label: details} dict."""
+    details = _read_json(data_dir, "sectors.json")
+    if not isinstance(details, dict) or not details or not all(isinstance(d, dict) for d in details.values()):
+        raise RegistryError("sectors.json: expected an object of sector details")
+    return details
+
+
+def _read_pairs(data_dir, file_name, columns):
+    """Rows of a two-column CSV as cleaned (first, second) pairs, skipping blank rows."""
+    path = os.path.join(data_dir, file_name)
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.DictReader(handle)
+            if reader.fieldnames is None or not set(columns) <= set(reader.fieldnames):
+                raise RegistryError(f"{path}: expected columns {', '.join(columns)}")
+            pairs = []
+            for line, row in enumerate(reader, 2):
+                first, second = clean_name(row[columns[0]]), clean_name(row[columns[1]])
+                if not first and not second:
+                    continue
+                if not first or not second:
+                    raise RegistryError(f"{path}:{line}: both {columns[0]} and {columns[1]} are required")
+                pairs.append((first, second))
+            return pairs
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        raise RegistryError(f"{path}: {e}") from e
+
+
+class Registry:
+    """One immutable version of the registry, with its matchers prebuilt. Shared by all sessions."""
+
+    def __init__(self, static_lists, aliases, regulator_keywords, sector_details, version="", source_hash=""):
+        """static_lists is an ordered sequence of (sector label, names); earlier lists win in classify()."""
+        self.version = str(version)
+        self.source_hash = source_hash
+        self.sector_details = dict(sector_details)
+        self.sector_labels = list(self.sector_details)
+        self.static_lists = tuple((label, tuple(dict.fromkeys(names))) for label, names in static_lists)
+        self.all_orgs = sorted({name for _, names in self.static_lists for name in names})
+        self.aliases = {name: list(dict.fromkeys(names)) for name, names in aliases.items()}
+        self.regulator_keywords = {regulator: list(dict.fromkeys(words)) for regulator, words in regulator_keywords.items()}
+        self.static_matcher = OrgMatcher(self.static_lists)
+        self.fuzzy_index = FuzzyIndex(self.all_orgs, aliases=self.aliases)
+
+    def __len__(self):
+        return len(self.all_orgs)
+
+
+def compile_registry(data_dir):
+    """Reads and validates the data files into a Registry; raises RegistryError on bad data."""
+    manifest = _read_json(data_dir, "manifest.json")
+    if not isinstance(manifest, dict):
+        raise RegistryError("manifest.json: expected an object with version and precedence")
+    sector_details = read_sector_details(data_dir)
+    precedence = manifest.get("precedence") or []
+    if not isinstance(precedence, list) or not all(isinstance(label, str) for label in precedence):
+        raise RegistryError("manifest.json: precedence must be a list of sector labels")
+    unknown = [label for label in precedence if label not in sector_details]
+    if unknown:
+        raise RegistryError(f"manifest.json: precedence names unknown sectors: {', '.join(unknown)}")
+
+    lists = {label: [] for label in precedence}
+    for label, name in _read_pairs(data_dir, "organizations.csv", ("sector", "name")):
+        if label not in lists:
+            raise RegistryError(f"organizations.csv: {name!r} is listed under {label!r}, which is not in the manifest precedence")
+        lists[label].append(name)
+
+    listed = {name for names in lists.values() for name in names}
+    aliases = {}
+    for name, alias in _read_pairs(data_dir, "aliases.csv", ("name", "alias")):
+        if name not in listed:
+            raise RegistryError(f"aliases.csv: alias {alias!r} points at {name!r}, which is not in organizations.csv")
+        aliases.setdefault(name, []).append(alias)
+
+    keywords = {}
+    for regulator, keyword in _read_pairs(data_dir, "regulator_keywords.csv", ("regulator", "keyword")):
+        keywords.setdefault(regulator, []).append(keyword)
+
+    return Registry(list(lists.items()), aliases, keywords, sector_details,
+                    version=manifest.get("version", ""), source_hash=source_hash(data_dir))
+
+
+def save_snapshot(registry, path):
+    """Pickles the registry next to `path` and renames it into place, so readers never see half a file."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as handle:
+            pickle.dump({"format": SNAPSHOT_FORMAT, "registry": registry}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_snapshot(path):
+    """The Registry pickled at path, or None if it is missing, unreadable or of another format."""
+    # Unpickling allocates millions of objects; collecting in between only slows it down
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, "rb") as handle:
+            snapshot = pickle.load(handle)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError, ValueError):
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return snapshot.get("registry")
+
+
+def load_registry(data_dir, snapshot_path=None):
+    """Returns (registry, compiled): the snapshot when it matches the data files, else a fresh compile.
+
+    A fresh compile is written back to snapshot_path when that is writable.
+    """
+    current_hash = source_hash(data_dir)
+    if snapshot_path:
+        registry = load_snapshot(snapshot_path)
+        if registry is not None and registry.source_hash == current_hash:
+            return registry, False
+    registry = compile_registry(data_dir)
+    if snapshot_path:
+        try:
+            save_snapshot(registry, snapshot_path)
+        except OSError:
+            pass
+    return registry, True
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Deadlines, retries and a circuit breaker for calls to the AI provider.
+
+call_with_retries / call_with_retries_async run a call under an overall
+deadline, retrying transient failures (timeouts, connection errors, 429 and
+5xx responses) with full-jitter exponential backoff. A shared CircuitBreaker
+stops calling the provider after repeated transient failures, so callers fail
+in microseconds instead of waiting out a timeout on every request while the
+provider is down; after a cool-down one trial call is let through. Other errors
+(a 400, a local TypeError) are raised without touching the breaker.
+"""
+import random
+import threading
+import time
+
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling the provider while the circuit is open or the deadline is spent."""
+
+
+def is_transient(exc):
+    """True for errors worth retrying: timeouts, dropped connections, rate limits and 5xx responses."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in TRANSIENT_STATUS_CODES
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # httpx / cohere transport errors, matched by name so this module needs neither installed
+    name = type(exc).__name__
+    return any(marker in name for marker in ("Timeout", "Connect", "RemoteProtocol", "ReadError", "WriteError"))
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures -> half-open after `recovery_timeout`.
+
+    In half-open state a single trial call is allowed; its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Returns True if a call may go to the provider now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Gives up a half-open trial that ended without a verdict on the provider (cancelled, interrupted or
+        a non-transient error), so another may run."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+def backoff_delay(attempt, base=0.5, cap=4.0, rng=random):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retries(call, breaker, deadline_seconds, attempt_timeout, max_retries=2, clock=time.monotonic,
+                      sleep=time.sleep):
+    """Runs call(timeout) until it succeeds, retrying transient errors within an overall deadline.
+
+    call receives the seconds it may take for this attempt. Raises ProviderUnavailable when the
+    breaker is open or there is no time left, otherwise re-raises the last error.
+    """
+    deadline = clock() + deadline_seconds
+    attempt = 0
+    while True:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise ProviderUnavailable("AI deadline exceeded")
+        if not breaker.allow():
+            raise ProviderUnavailable("AI provider circuit is open")
+        try:
+            result = call(min(attempt_timeout, remaining))
+        except Exception as exc:
+            if not is_transient(exc):
+                # A bad request or a local bug says nothing about the provider's health
+                breaker.release_trial()
+                raise
+            breaker.record_failure()
+            if attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            if clock() + delay >= deadline:
+                raise
+            sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            breaker.release_trial()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def call_with_retries_async(call, breaker, deadline_seconds, attempt_timeout, max_retries=2,
+                                  clock=time.monotonic):
+    """Async twin of call_with_retries; call(timeout) returns an awaitable."""
+    import asyncio
+
+    deadline = clock() + deadline_seconds
+    attempt = 0
+    while True:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise ProviderUnavailable("AI deadline exceeded")
+        if not breaker.allow():
+            raise ProviderUnavailable("AI provider circuit is open")
+        timeout = min(attempt_timeout, remaining)
+        try:
+            result = await asyncio.wait_for(call(timeout), timeout)
+        except Exception as exc:
+            if not is_transient(exc):
+                # A bad request or a local bug says nothing about the provider's health
+                breaker.release_trial()
+                raise
+            breaker.record_failure()
+            if attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            if clock() + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            breaker.release_trial()
+            raise
+        breaker.record_success()
+        return result
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""Process-wide scheduling of AI provider calls shared by every Streamlit session.
+
+SingleFlight merges identical in-flight requests so that concurrent lookups of
+the same name cost one call. FairScheduler enforces a global token-bucket
+quota and hands out tokens round-robin between sessions (FIFO within a
+session), so one analyst's bulk job cannot starve another's single lookup.
+Both keep counters for sizing the provider plan.
+"""
+import contextlib
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+
+from resilience import ProviderUnavailable
+
+# Which session a call is made on behalf of; set once per Streamlit run (or job) by the caller
+CURRENT_SESSION = contextvars.ContextVar("ai_session", default="default")
+
+
+@contextlib.contextmanager
+def session_scope(session_id):
+    token = CURRENT_SESSION.set(session_id)
+    try:
+        yield
+    finally:
+        CURRENT_SESSION.reset(token)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """do(key, fn) runs fn once for all callers that ask for the same key while it is running."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class FairScheduler:
+    """Token bucket (`rate` tokens/s, up to `burst` saved) with round-robin queuing between sessions.
+
+    Only the oldest ticket of the session at the head of the rotation may take a token; after it
+    does, that session moves to the back of the rotation.
+    """
+
+    # How often async waiters that are not first in line re-check the queue
+    ASYNC_POLL_SECONDS = 0.02
+
+    def __init__(self, rate, burst, clock=time.monotonic, history=1000):
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"FairScheduler needs rate > 0 and burst >= 1, got rate={rate}, burst={burst}")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._cond = threading.Condition()
+        self._queues = {}      # session -> deque of waiting tickets
+        self._order = deque()  # sessions with waiting tickets, in serving order
+        self._tickets = itertools.count()
+        self._waits = deque(maxlen=history)
+        self.granted = 0
+        self.timed_out = 0
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _enqueue(self, session):
+        ticket = next(self._tickets)
+        if session not in self._queues:
+            self._queues[session] = deque()
+            self._order.append(session)
+        self._queues[session].append(ticket)
+        return ticket
+
+    def _try_grant(self, session, ticket):
+        """0 when the ticket got a token, else seconds until it might (None: not first in line)."""
+        self._refill()
+        if self._order[0] != session or self._queues[session][0] != ticket:
+            return None
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        self._tokens -= 1
+        self.granted += 1
+        self._queues[session].popleft()
+        self._order.popleft()
+        if self._queues[session]:
+            self._order.append(session)
+        else:
+            del self._queues[session]
+        return 0
+
+    def _abandon(self, session, ticket):
+        queue = self._queues.get(session)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[session]
+            self._order.remove(session)
+
+    def _finish(self, start, granted):
+        waited = self._clock() - start
+        if granted:
+            self._waits.append(waited)
+        else:
+            self.timed_out += 1
+        self._cond.notify_all()
+        return waited
+
+    def acquire(self, session=None, timeout=None):
+        """Blocks until the caller's session may make one call; returns the seconds waited.
+
+        Raises ProviderUnavailable if no token was granted within `timeout` seconds.
+        """
+        session = CURRENT_SESSION.get() if session is None else session
+        start = self._clock()
+        with self._cond:
+            ticket = self._enqueue(session)
+            try:
+                while True:
+                    wait = self._try_grant(session, ticket)
+                    if wait == 0:
+                        return self._finish(start, True)
+                    remaining = None if timeout is None else start + timeout - self._clock()
+                    if remaining is not None and remaining <= 0:
+                        self._abandon(session, ticket)
+                        self._finish(start, False)
+                        raise ProviderUnavailable("Timed out waiting for an AI rate-limit slot")
+                    self._cond.wait(min((w for w in (wait, remaining) if w is not None), default=None))
+            except BaseException:
+                self._abandon(session, ticket)
+                raise
+
+    def try_acquire(self):
+        """Takes a token only if one is free and nobody is queued; never waits. For optional work."""
+        with self._cond:
+            self._refill()
+            if self._order or self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.granted += 1
+            return True
+
+    async def acquire_async(self, session=None, timeout=None):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the event loop."""
+        import asyncio
+
+        session = CURRENT_SESSION.get() if session is None else session
+        start = self._clock()
+        with self._cond:
+            ticket = self._enqueue(session)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_grant(session, ticket)
+                    if wait == 0:
+                        return self._finish(start, True)
+                    remaining = None if timeout is None else start + timeout - self._clock()
+                    if remaining is not None and remaining <= 0:
+                        self._abandon(session, ticket)
+                        self._finish(start, False)
+                        raise ProviderUnavailable("Timed out waiting for an AI rate-limit slot")
+                await asyncio.sleep(min(w for w in (wait or self.ASYNC_POLL_SECONDS, remaining) if w is not None))
+        except BaseException:
+            with self._cond:
+                self._abandon(session, ticket)
+            raise
+
+    def stats(self):
+        """Current queue depth and recent wait times (seconds), for sizing the provider plan."""
+        with self._cond:
+            self._refill()
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "sessions_waiting": len(self._queues),
+                "tokens_available": round(self._tokens, 2),
+                "rate_per_minute": self.rate * 60,
+                "granted": self.granted,
+                "timed_out": self.timed_out,
+                "wait_p50": _percentile(waits, 0.5),
+                "wait_p95": _percentile(waits, 0.95),
+                "wait_max": waits[-1] if waits else 0.0,
+            }
@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import cohere
-import json
-import re
 import pandas as pd
 import os
+import tempfile
+import time
+import sector_core
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from bulk_jobs import pick_name_column, write_enriched_csv
+from sector_core import (
+    SECTOR_LABELS, AI_MODEL, KNN_CONFIDENCE_THRESHOLD, SOURCE_CACHE, SOURCE_COHERE, SOURCE_LOCAL, SOURCE_UNAVAILABLE,
+    ai_available, ai_scheduler_stats, ai_session, aggregate_recommendations, classify_ai_in_background, classify_statically,
+    clauses_for_service, compliance_appendix, compliance_services, find_static_matches, get_bulk_store, get_metrics, lookup_ai_answer,
+    near_miss_match, prefetch_ai_answers, registry_status, run_bulk_classification, search_orgs,
+)
+
+AI_SOURCE_LABELS = {
+    SOURCE_CACHE: "💾 cached Cohere answer",
+    SOURCE_LOCAL: "⚡ local model (no Cohere call)",
+    SOURCE_COHERE: f"☁️ Cohere ({AI_MODEL})",
+}
 
 # --- Authentication Setup ---
 # The password is now fetched from Streamlit's secure secrets management
@@ -14,6 +28,8 @@ try:
 except KeyError:
     st.error("Authentication password not found in st.secrets. Please configure it.")
     st.stop()
+# Optional: logging in with ADMIN_PASSWORD also unlocks the metrics page
+ADMIN_PASSWORD = st.secrets.get("ADMIN_PASSWORD")
 
 
 # Initialize session state for authentication
@@ -27,8 +43,9 @@ if not st.session_state["authenticated"]:
     password_input = st.text_input("", type="password")
     
     if st.button("🔐🔐🔐"):
-        if password_input == PASSWORD:
+        if password_input == PASSWORD or (ADMIN_PASSWORD and password_input == ADMIN_PASSWORD):
             st.session_state["authenticated"] = True
+            st.session_state["is_admin"] = bool(ADMIN_PASSWORD) and password_input == ADMIN_PASSWORD
             st.rerun()  # Rerun the app to show the main content
         else:
             st.error("❌ รหัสผ่านไม่ถูกต้อง กรุณาลองอีกครั้ง")
@@ -43,187 +60,18 @@ if not st.session_state["authenticated"]:
 # Example secrets.toml:
 # COHERE_API_KEY = "your_cohere_api_key_here"
 try:
-    co = cohere.Client(st.secrets["COHERE_API_KEY"])
+    sector_core.configure(st.secrets["COHERE_API_KEY"])
 except Exception as e:
     st.error("Cohere API key not found. Please add it to your Streamlit secrets.")
     st.stop()
 
 
-# --- Static Lists from Thai NCSA ---
-NCSA_CII = [
-    "กรมการปกครอง", "กรมการแพทย์", "กรมการแพทย์แผนไทยและการแพทย์ทางเลือก", "กรมควบคุมโรค",
-    "กรมป้องกันและบรรเทาสาธารณภัย", "กรมวิทยาศาสตร์การแพทย์", "กรมสนับสนุนบริการสุขภาพ", "กรมสุขภาพจิต",
-    "กรมอนามัย", "กรมอุตุนิยมวิทยา", "กองการบินทหารเรือ", "กองทะเบียนประวัติอาชญากร", "กองทัพบก",
-    "กองทัพเรือ", "กองทัพอากาศ", "กองบัญชาการกองทัพไทย", "กองอำนวยการรักษาความมั่นคงภายในราชอาณาจักร",
-    "การท่าเรือแห่งประเทศไทย", "การท่าอากาศยานอู่ตะเภา", "การประปาส่วนภูมิภาค", "การไฟฟ้านครหลวง",
-    "การไฟฟ้าฝ่ายผลิตแห่งประเทศไทย", "การไฟฟ้าส่วนภูมิภาค", "การรถไฟฟ้าขนส่งมวลชนแห่งประเทศไทย",
-    "การรถไฟแห่งประเทศไทย", "ตลาดหลักทรัพย์แห่งประเทศไทย", "ธนาคารกรุงเทพ", "ธนาคารกรุงไทย",
-    "ธนาคารกรุงศรีอยุธยา", "ธนาคารกสิกรไทย", "ธนาคารทหารไทยธนชาต", "ธนาคารไทยพาณิชย์",
-    "ธนาคารเพื่อการเกษตรและสหกรณ์การเกษตร", "ธนาคารแห่งประเทศไทย", "ธนาคารออมสิน"
-]
-NCSA_REG = [
-    "กรมการขนส่งทางราง", "กรมการปกครอง", "กรมชลประทาน", "กรมศุลกากร", "กระทรวงการคลัง",
-    "กระทรวงพลังงาน", "การประปาส่วนภูมิภาค", "ธนาคารแห่งประเทศไทย",
-    "สำนักงานการบินพลเรือนแห่งประเทศไทย", "สำนักงานคณะกรรมการกำกับหลักทรัพย์และตลาดหลักทรัพย์",
-    "สำนักงานคณะกรรมการกิจการกระจายเสียง กิจการโทรทัศน์ และกิจการโทรคมนาคมแห่งชาติ",
-    "สำนักงานคณะกรรรมการอาหารและยา", "สำนักงานตำรวจแห่งชาติ", "สำนักงานปรมาณูเพื่อสันติ",
-    "สำนักงานปลัดกระทรวงกลาโหม", "สำนักงานปลัดกระทรวงคมนาคม", "สำนักงานปลัดกระทรวงสาธารณสุข",
-    "สำนักงานพัฒนารัฐบาลดิจิทัล (องค์การมหาชน)", "สำนักงานสภาความมั่นคงแห่งชาติ"
-]
-NCSA_GOV = [
-    "กรมการกงสุล", "กรมการขนส่งทางบก", "กรมการข้าว", "มหาวิทยาลัยเกษตรศาสตร์", "กระทรวงศึกษาธิการ",
-] + [
-    "กรมการค้าต่างประเทศ","กรมการค้าภายใน","กรมการจัดหางาน","กรมการท่องเที่ยว","กรมการเปลี่ยนแปลงสภาพภูมิอากาศและสิ่งแวดล้อม",
-    "กรมการพัฒนาชุมชน","กรมการศาสนา","กรมกิจการเด็กและเยาวชน","กรมกิจการผู้สูงอายุ","กรมกิจการสตรีและสถาบันครอบครัว",
-]
-# Combine all static lists into a single list for easier searching
-ALL_STATIC_ORGS = sorted(list(set(NCSA_CII + NCSA_REG + NCSA_GOV)))
-
-
-# --- Keyword lists for BFSI sub-sector refinement ---
-BANKING_KEYWORDS = ["ธนาคาร", "bank", "tmb", "scb", "kbank", "สินเชื่อ", "ttb"]
-INSURANCE_KEYWORDS = ["ประกัน", "insurance", "life", "เมืองไทย", "กรุงเทพประกันชีวิต", "axa", "aia", "อินชัวรันส์"]
-SEC_KEYWORDS = ["หลักทรัพย์", "securities", "บลจ.", "ตลาดหลักทรัพย์", "asset management", "exchange", "ก.ล.ต."]
-
-
-# Sector-to-service mapping with compliance and regulator info
-SECTOR_DETAILS = {
-    "Critical Infrastructure (CII)": {
-        "key_services": ["Cyber Risk Assessment (IT/OT)", "Tabletop Exercise (TTX)", "CIRP & Playbook"],
-        "secondary_opportunities": ["Gap Assessment", "BCP Alignment"],
-        "iso27001_expected": True,
-        "regulators": ["สกมช. (NCSA)"],
-        "compliance_drivers": ["Cybersecurity Act B.E. 2562", "ISO/IEC 27001"]
-    },
-    "Regulator": {
-        "key_services": ["Cybersecurity Policy Consult", "Regulatory Gap Assessment", "Awareness for Regulators"],
-        "secondary_opportunities": ["TTX for National Crisis", "Threat Intelligence Briefing"],
-        "iso27001_expected": False,
-        "regulators": ["Self-Regulated / Government Oversight"],
-        "compliance_drivers": ["Relevant Royal Decrees", "Ministerial Regulations"]
-    },
-     "Government / SOE": {
-        "key_services": ["TTX", "IRP", "Cyber Risk Assessment"],
-        "secondary_opportunities": ["Gap Assessment", "อว3/อช3 Consult"],
-        "iso27001_expected": False,
-        "regulators": ["สพธอ. (ETDA)", "สกมช. (NCSA)"],
-        "compliance_drivers": ["Cybersecurity Act B.E. 2562", "Official Information Act B.E. 2540"]
-    },
-    "Banking / Finance / Insurance (BFSI)": {
-        "key_services": ["PDPA Consult", "Pentest", "IRP & Playbook"],
-        "secondary_opportunities": ["Source Code Scan", "Awareness Training"],
-        "iso27001_expected": True,
-        "regulators": ["ธปท. (BOT)", "คปภ. (OIC)", "ก.ล.ต. (SEC)"],
-        "compliance_drivers": ["BOT/OIC/SEC Guidelines", "PDPA", "ISO/IEC 27001"]
-    },
-    "Healthcare": {
-        "key_services": ["PDPA Consult", "IRP & TTX"],
-        "secondary_opportunities": ["Phishing Simulation", "Awareness Training"],
-        "iso27001_expected": False,
-        "regulators": ["กระทรวงสาธารณสุข (MOPH)", "สคส. (PDPC)"],
-        "compliance_drivers": ["PDPA", "National Health Act B.E. 2550"]
-    },
-    "Telco / ISP": {
-        "key_services": ["Zero Trust Readiness", "CIRP"],
-        "secondary_opportunities": ["Gap Assessment", "Managed CSOC"],
-        "iso27001_expected": True,
-        "regulators": ["กสทช. (NBTC)", "สกมช. (NCSA)"],
-        "compliance_drivers": ["NBTC Privacy Requirements", "Cybersecurity Act B.E. 2562"]
-    },
-    "Software / Tech / SaaS": {
-        "key_services": ["Secure SDLC Gap Assessment", "Source Code Scan", "Pentest"],
-        "secondary_opportunities": ["Awareness Training", "CI/CD Security"],
-        "iso27001_expected": True,
-        "regulators": ["สคส. (PDPC)", "สกมช. (NCSA)"],
-        "compliance_drivers": ["PDPA", "Secure SDLC Best Practices"]
-    },
-    "Retail / SME / Logistics": {
-        "key_services": ["VA Scan", "PDPA Consult"],
-        "secondary_opportunities": ["Awareness Training", "Phishing Simulation"],
-        "iso27001_expected": False,
-        "regulators": ["สคส. (PDPC)"],
-        "compliance_drivers": ["PDPA", "Business Continuity Planning"]
-    },
-    "Manufacturing / OT-heavy": {
-        "key_services": ["Cyber Risk Assessment (IT/OT)", "CIRP"],
-        "secondary_opportunities": ["TTX", "Backup/Restore Drill"],
-        "iso27001_expected": False,
-        "regulators": ["สกมช. (NCSA)"],
-        "compliance_drivers": ["Cybersecurity Act B.E. 2562", "Supply Chain Risk Framework"]
-    }
-}
-
-
-SECTOR_LABELS = list(SECTOR_DETAILS.keys())
-
-PROMPT_INSTRUCTION = f"""
-You are a sector classification assistant. Your task is to categorize a company into one of the following sectors based on its name and likely business activities:
-{', '.join(SECTOR_LABELS)}
-
-Provide your answer in a JSON format with two keys: "sector" and "reason". The "reason" should be a brief explanation for your choice.
-
-Example:
-Company: "Krungthai AXA"
-Output:
-{{"sector": "Banking / Finance / Insurance (BFSI)", "reason": "The name contains 'Krungthai' and 'AXA', which are strongly associated with banking and insurance."}}
-"""
-
-def find_suggestions(keyword):
-    """Searches the combined static list for names containing the keyword."""
-    if not keyword:
-        return []
-    keyword_lower = keyword.lower()
-    return [org for org in ALL_STATIC_ORGS if keyword_lower in org.lower()]
-
-def classify_statically(entity_name):
-    name_lower = entity_name.lower()
-    if any(item.lower() in name_lower for item in NCSA_CII):
-        return "Critical Infrastructure (CII)"
-    if any(item.lower() in name_lower for item in NCSA_REG):
-        return "Regulator"
-    if any(item.lower() in name_lower for item in NCSA_GOV):
-        return "Government / SOE"
-    return None
-
-def get_mapped_sector_from_ai_response(ai_sector_name):
-    if not ai_sector_name:
-        return None
-    if ai_sector_name in SECTOR_DETAILS:
-        return ai_sector_name
-    for key in SECTOR_DETAILS:
-        if ai_sector_name.lower() in key.lower():
-            return key
-    return None
-
-def classify_with_ai(company_name):
-    try:
-        response_text = co.chat(
-            model="command-r-plus",
-            message=f"{PROMPT_INSTRUCTION}\nCompany: {company_name}",
-            temperature=0.3
-        ).text
-        cleaned_json_str = re.sub(r"```json|```", "", response_text).strip()
-        parsed_json = json.loads(cleaned_json_str)
-        raw_ai_sector = parsed_json.get("sector", "").strip()
-        mapped_sector = get_mapped_sector_from_ai_response(raw_ai_sector)
-        reason = parsed_json.get("reason", "No reason provided by AI.")
-        return mapped_sector, reason
-    except Exception:
-        return None, None
-
 def display_unified_recommendations(sectors):
-    key_services = set()
-    secondary_opportunities = set()
-    compliance_drivers = set()
-    regulators = set()
-
-    for sector in sectors:
-        if sector in SECTOR_DETAILS:
-            details = SECTOR_DETAILS[sector]
-            key_services.update(details.get("key_services", []))
-            secondary_opportunities.update(details.get("secondary_opportunities", []))
-            compliance_drivers.update(details.get("compliance_drivers", []))
-            regulators.update(details.get("regulators", []))
+    recommendations = aggregate_recommendations(sectors)
+    key_services = recommendations["key_services"]
+    secondary_opportunities = recommendations["secondary_opportunities"]
+    compliance_drivers = recommendations["compliance_drivers"]
+    regulators = recommendations["regulators"]
 
     st.markdown("## 🌟 Unified Recommendations")
     st.markdown("Based on the combined analysis of both rule-based and AI classifications.")
@@ -232,12 +80,12 @@ def display_unified_recommendations(sectors):
     with col1:
         st.markdown("### ✅ Key Services")
         if key_services:
-            for svc in sorted(list(key_services)):
+            for svc in key_services:
                 st.markdown(f"- {svc}")
     with col2:
         st.markdown("### 💡 Secondary Opportunities")
         if secondary_opportunities:
-            for opt in sorted(list(secondary_opportunities)):
+            for opt in secondary_opportunities:
                 st.markdown(f"- {opt}")
     
     st.markdown("---")
@@ -246,32 +94,248 @@ def display_unified_recommendations(sectors):
     with col3:
         st.markdown("### 📋 Compliance Drivers")
         if compliance_drivers:
-            for law in sorted(list(compliance_drivers)):
+            for law in compliance_drivers:
                 st.markdown(f"- {law}")
     with col4:
         st.markdown("### 🏩 Sector Regulators")
         if regulators:
-            for reg in sorted(list(regulators)):
+            for reg in regulators:
                 st.markdown(f"- {reg}")
 
-@st.cache_data
-def load_csv_data(file_path):
-    """Loads data from a CSV file, with caching."""
-    if not os.path.exists(file_path):
-        return None 
+COMPLIANCE_TITLES = {
+    "NCSA": "📑 รายละเอียดข้อกำหนดตาม พ.ร.บ. ไซเบอร์ฯ",
+    "BOT": "🏦 รายละเอียดข้อกำหนดตามแนวทางของธนาคารแห่งประเทศไทย (BOT)",
+    "OIC": "🛡️ รายละเอียดข้อกำหนดตามแนวทางของสำนักงาน คปภ. (OIC)",
+    "SEC": "📈 รายละเอียดข้อกำหนดตามแนวทางของสำนักงาน ก.ล.ต. (SEC)",
+}
+
+def display_compliance_table(table):
+    """Renders one regulator's requirement rows from the compliance index, or a warning if its CSV is unavailable."""
+    st.markdown(f"### {COMPLIANCE_TITLES.get(table.regulator, table.regulator)}")
+    if table.rows:
+        st.dataframe(pd.DataFrame(table.rows, columns=table.columns), use_container_width=True, hide_index=True)
+    else:
+        if table.error and table.error != "missing":
+            st.error(f"An error occurred while reading the CSV file '{table.path}': {table.error}")
+        st.warning(f"Could not load data for this section. Please ensure the file '{os.path.basename(table.path)}' exists in the application directory.")
+
+def display_service_lookup():
+    """Reverse lookup: every regulator clause that calls for a chosen service."""
+    with st.expander("🔎 Which regulator clauses call for a service?"):
+        service = st.selectbox("Service", compliance_services(), index=None, key="service_lookup", placeholder="Choose a service...")
+        if service:
+            clauses = [(c.regulator, c.clause, c.topic, c.level or "") for c in clauses_for_service(service)]
+            st.dataframe(pd.DataFrame(clauses, columns=["Regulator", "Clause", "Topic", "Level"]), use_container_width=True, hide_index=True)
+
+
+def read_uploaded_names(uploaded_file):
+    """Reads an uploaded CSV/XLSX and returns (DataFrame, name column)."""
+    if uploaded_file.name.lower().endswith(".xlsx"):
+        df = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        df = pd.read_csv(uploaded_file, dtype=str)
+    df = df.fillna("")
+    return df, pick_name_column(list(df.columns))
+
+BULK_LIVE_ROWS = 200
+
+def bulk_app(knn_threshold=None):
+    """Batch mode: classify every row of an uploaded lead list and export an enriched CSV."""
+    st.markdown("## 📦 Bulk Classification")
+    st.caption("Upload a CSV or XLSX of company names. Progress is checkpointed, so re-uploading the same file resumes an interrupted job.")
+
+    uploaded_file = st.file_uploader("Company list", type=["csv", "xlsx"], key="bulk_file")
+    if uploaded_file is None:
+        return
+
     try:
-        return pd.read_csv(file_path)
+        df, default_column = read_uploaded_names(uploaded_file)
     except Exception as e:
-        st.error(f"An error occurred while reading the CSV file '{file_path}': {e}")
-        return None
-
-def display_compliance_table(df, title, file_path):
-    """Renders a DataFrame as a table with a title, or shows an error if df is None."""
-    st.markdown(f"### {title}")
-    if df is not None and not df.empty:
-        st.dataframe(df, use_container_width=True, hide_index=True)
+        st.error(f"An error occurred while reading '{uploaded_file.name}': {e}")
+        return
+    if df.empty:
+        st.warning("The uploaded file has no rows.")
+        return
+
+    columns = list(df.columns)
+    name_column = st.selectbox("Column containing company names", columns, index=columns.index(default_column))
+    concurrency = st.slider("Concurrent AI requests", min_value=1, max_value=32, value=8)
+    ai_for_static_hits = st.checkbox("Also ask the AI for names already matched by the NCSA lists", value=False)
+    batch = st.checkbox("Pack several names into each AI request", value=True,
+                        help="Sends the prompt once per batch of names instead of once per name. Saves most of the tokens on large files.")
+
+    if not st.button("🚀 Run bulk classification", key="bulk_run"):
+        return
+
+    names = [str(v).strip() for v in df[name_column].tolist()]
+    store = get_bulk_store()
+    progress = st.progress(0.0, text="Starting...")
+    live_table = st.empty()
+    results = {}
+    state = {"last_render": 0.0}
+
+    def on_result(row_idx, result, resumed):
+        results[row_idx] = result
+        now = time.monotonic()
+        # Redrawing the table is the expensive part; throttle it for large files
+        if now - state["last_render"] < 0.5 and len(results) < len(names):
+            return
+        state["last_render"] = now
+        progress.progress(len(results) / len(names), text=f"{len(results):,} / {len(names):,} rows")
+        recent = [results[i] for i in sorted(results)[-BULK_LIVE_ROWS:]]
+        live_table.dataframe(pd.DataFrame(recent), use_container_width=True, hide_index=True)
+
+    job_id = run_bulk_classification(
+        names, on_result=on_result, concurrency=concurrency, ai_for_static_hits=ai_for_static_hits, store=store,
+        knn_threshold=knn_threshold, batch=batch,
+    )
+    progress.progress(1.0, text=f"{len(names):,} / {len(names):,} rows")
+
+    out_path = os.path.join(tempfile.gettempdir(), f"sector_bulk_{job_id}.csv")
+    finished = write_enriched_csv(job_id, store, out_path, names, source_rows=df.to_dict("records"), source_columns=columns)
+    if finished < len(names):
+        st.warning(f"{len(names) - finished:,} rows could not be classified by the AI; they are in the CSV with blank sector columns. "
+                   "Run the job again to retry only those rows.")
     else:
-        st.warning(f"Could not load data for this section. Please ensure the file '{file_path}' exists in the application directory.")
+        st.success(f"Classified {finished:,} rows (job {job_id}).")
+    with open(out_path, "rb") as handle:
+        st.download_button("⬇️ Download enriched CSV", handle.read(), file_name=f"{os.path.splitext(uploaded_file.name)[0]}_sectors.csv", mime="text/csv")
+
+
+def display_ai_queue_stats():
+    """Sidebar snapshot of the Cohere queue shared by all sessions, for sizing the API plan."""
+    stats = ai_scheduler_stats()
+    with st.sidebar.expander("☁️ Cohere queue"):
+        st.metric("Waiting requests", stats["queue_depth"])
+        st.metric("Queue wait (p95)", f"{stats['wait_p95']:.1f} s")
+        st.caption(
+            f"{stats['granted']:,} calls sent, {stats['lookups_coalesced']:,} duplicate lookups merged, "
+            f"{stats['timed_out']:,} timed out waiting. Limit: {stats['rate_per_minute']:.0f} calls/min."
+        )
+
+
+STAGE_LABELS = {
+    "page": "Whole page run",
+    "static_classify": "Static (NCSA) classification",
+    "ai_classify": "AI classification (cache / local model / Cohere)",
+    "cohere_single": "Cohere call, single name",
+    "cohere_batch": "Cohere call, batch",
+    "recommendations_render": "Recommendations render",
+    "appendix_load": "Appendix index read",
+    "appendix_render": "Appendix tables render",
+}
+
+def format_bucket(bound):
+    if bound is None:
+        return "> 30 s"
+    return f"≤ {bound * 1e3:g} ms" if bound < 1 else f"≤ {bound:g} s"
+
+def metrics_app():
+    """Admin-only: rolling stage latencies, Cohere usage and cache hit rates of this server process."""
+    metrics = get_metrics()
+    st.markdown("## 📈 Metrics")
+    st.caption(f"Latencies cover the last {metrics.window // 60} minutes; counters run since the server started. "
+               "Numbers are for this server process and all its sessions.")
+    registry = registry_status()
+    st.caption(f"Organization registry version {registry['version']}: {registry['organizations']:,} organizations.")
+    if registry["error"]:
+        st.warning(f"Last registry reload failed, still serving version {registry['version']}: {registry['error']}")
+
+    hits, misses = metrics.total("ai_cache_lookups", result="hit"), metrics.total("ai_cache_lookups", result="miss")
+    answers = metrics.total("ai_answers")
+    cols = st.columns(4)
+    cols[0].metric("AI cache hit rate", f"{hits / (hits + misses):.0%}" if hits + misses else "–", f"{hits + misses:,} lookups", delta_color="off")
+    without_cohere = metrics.total("ai_answers", source=SOURCE_CACHE) + metrics.total("ai_answers", source=SOURCE_LOCAL)
+    cols[1].metric("Answered without Cohere", f"{without_cohere / answers:.0%}" if answers else "–",
+                   f"{answers:,} AI-column answers", delta_color="off")
+    cols[2].metric("Cohere requests", f"{metrics.total('cohere_requests'):,}", f"{metrics.total('cohere_retries'):,} retries", delta_color="off")
+    cols[3].metric("Cohere tokens (in / out)", f"{metrics.total('cohere_input_tokens'):,} / {metrics.total('cohere_output_tokens'):,}")
+    cols = st.columns(4)
+    cols[0].metric("Cohere errors", f"{metrics.total('cohere_errors'):,}", f"{metrics.total('cohere_errors', reason='unavailable'):,} skipped or timed out", delta_color="off")
+    cols[1].metric("Parse failures", f"{metrics.total('cohere_parse_failures'):,}")
+    cols[2].metric("Compliance index builds", f"{metrics.total('compliance_index_builds'):,}")
+    cols[3].metric("AI answers by source", " / ".join(
+        f"{metrics.total('ai_answers', source=source):,}" for source in (SOURCE_CACHE, SOURCE_LOCAL, SOURCE_COHERE)),
+        "cache / local / Cohere", delta_color="off")
+    fetched, used = metrics.total("ai_prefetch", result="fetched"), metrics.total("ai_prefetch", result="used")
+    cols = st.columns(4)
+    cols[0].metric("Prefetched answers clicked", f"{used / fetched:.0%}" if fetched else "–",
+                   f"{used:,} of {fetched:,} speculative Cohere calls", delta_color="off")
+    cols[1].metric("Prefetch skipped", f"{metrics.total('ai_prefetch', result='skipped'):,}",
+                   "over budget or Cohere down", delta_color="off")
+
+    rows = []
+    for stage in metrics.stages():
+        samples = sorted(metrics.rolling(stage))
+        if not samples:
+            continue
+        rows.append({
+            "stage": STAGE_LABELS.get(stage, stage), "runs": len(samples),
+            "p50 ms": round(samples[len(samples) // 2] * 1e3, 1),
+            "p95 ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))] * 1e3, 1),
+            "max ms": round(samples[-1] * 1e3, 1),
+        })
+    st.markdown("### ⏱️ Stage latency")
+    if not rows:
+        st.info("No timings recorded in the window yet. Classify a few organizations first.")
+    else:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        stage = st.selectbox("Histogram for stage", [s for s in metrics.stages() if metrics.rolling(s)],
+                             format_func=lambda s: STAGE_LABELS.get(s, s), key="metrics_stage")
+        histogram = metrics.bucket_counts(metrics.rolling(stage))
+        st.bar_chart(pd.DataFrame({"latency": [format_bucket(b) for b, _ in histogram], "runs": [c for _, c in histogram]}),
+                     x="latency", y="runs", sort=False)
+
+    with st.expander("Prometheus text"):
+        if metrics.exporter_address:
+            st.caption(f"Scrape endpoint: {metrics.exporter_address}")
+        elif metrics.exporter_error:
+            st.caption(f"Scrape endpoint not started: {metrics.exporter_error}")
+        else:
+            st.caption("Set SECTOR_METRICS_PORT to serve this at /metrics, or SECTOR_METRICS_LOG to write a JSON-lines log.")
+        if metrics.log_error:
+            st.caption(f"JSON-lines log stopped: {metrics.log_error}")
+        text = metrics.to_prometheus()
+        st.code(text, language="text")
+        st.download_button("⬇️ Download metrics.prom", text, file_name="metrics.prom", mime="text/plain")
+
+
+# How often the AI column checks on a background Cohere lookup (seconds)
+AI_POLL_SECONDS = 0.25
+
+def current_ai_answer(name, knn_threshold):
+    """(sector, reason, source) for name if it is ready; otherwise None, with a background lookup running.
+
+    A lookup that could not reach Cohere is shown once; the next run asks again if Cohere is reachable.
+    One that Cohere answered without a usable sector is kept, so reruns do not pay for it again.
+    """
+    key = (name, knn_threshold)
+    with get_metrics().span("ai_classify"):
+        answer = lookup_ai_answer(name, knn_threshold)
+    if answer is not None:
+        return answer
+    lookup = st.session_state.get("ai_lookup")
+    if lookup is not None and lookup["key"] == key:
+        if not lookup["future"].done():
+            return None
+        answer = lookup["future"].result()
+        if not (answer[2] == SOURCE_UNAVAILABLE and lookup["shown"] and ai_available()):
+            lookup["shown"] = True
+            return answer
+    st.session_state["ai_lookup"] = {
+        "key": key, "future": classify_ai_in_background(name, knn_threshold), "started": time.monotonic(), "shown": False,
+    }
+    return None
+
+@st.fragment(run_every=AI_POLL_SECONDS)
+def wait_for_ai_answer():
+    """Stands in for the AI column while Cohere answers, without blocking the rest of the page."""
+    lookup = st.session_state.get("ai_lookup")
+    if lookup is None or lookup["future"].done():
+        # Rerun the whole page so the recommendations and appendix pick up the AI sector too
+        st.rerun()
+    st.info(f"⏳ Asking Cohere... ({time.monotonic() - lookup['started']:.0f}s)")
+    st.caption("The rule-based result and its recommendations are shown meanwhile; the AI result is added when it arrives.")
 
 
 # --- Function to display the main app ---
@@ -279,6 +343,21 @@ def main_app():
     st.set_page_config(page_title="AI Sector + Service Mapper", page_icon="🧠", layout="wide")
     st.title("🧠 AI Sector Classifier + Service Recommendations")
 
+    modes = ["Single lookup", "Bulk upload"] + (["Metrics"] if st.session_state.get("is_admin") else [])
+    mode = st.sidebar.radio("Mode", modes, key="mode")
+    knn_threshold = st.sidebar.slider(
+        "Local model confidence threshold", min_value=0.0, max_value=1.0,
+        value=KNN_CONFIDENCE_THRESHOLD, step=0.05, key="knn_threshold",
+        help="Names the local model classifies with at least this confidence skip the Cohere call. Set to 1.0 to always ask Cohere.",
+    )
+    display_ai_queue_stats()
+    if mode == "Bulk upload":
+        bulk_app(knn_threshold)
+        return
+    if mode == "Metrics":
+        metrics_app()
+        return
+
     if 'org_to_classify' not in st.session_state:
         st.session_state.org_to_classify = None
 
@@ -289,16 +368,18 @@ def main_app():
     with button_col:
         if st.button("Search / Classify", key="search_button"):
             st.session_state.org_to_classify = company_input
-            st.session_state.suggestions = find_suggestions(company_input) if company_input else []
-            if company_input in st.session_state.suggestions:
+            st.session_state.suggestions = search_orgs(company_input) if company_input else []
+            if company_input in [org for org, _ in st.session_state.suggestions]:
                  st.session_state.org_to_classify = company_input
+            # Classify the likeliest picks while the user is still reading the list
+            prefetch_ai_answers([org for org, _ in st.session_state.suggestions], knn_threshold)
             st.rerun()
 
     if st.session_state.get('suggestions'):
         st.markdown("### 📝 Suggestions from Static Lists")
-        st.caption("Click a name to classify it, or classify your original text below.")
-        for org in st.session_state.suggestions:
-            if st.button(org, key=org):
+        st.caption("Click a name to classify it, or classify your original text below. Best matches first; close spellings and abbreviations are included.")
+        for org, score in st.session_state.suggestions:
+            if st.button(org, key=org, help=f"Match score: {score:.2f}"):
                 st.session_state.org_to_classify = org
                 st.session_state.suggestions = []
                 st.rerun()
@@ -307,25 +388,40 @@ def main_app():
         st.markdown("---")
         st.markdown(f"## 📊 Classification Analysis for: **{st.session_state.org_to_classify}**")
 
-        with st.spinner("Running classification..."):
-            static_sector = classify_statically(st.session_state.org_to_classify)
-            ai_sector, ai_reason = classify_with_ai(st.session_state.org_to_classify)
+        metrics = get_metrics()
+        with metrics.span("static_classify"):
+            static_sector = classify_statically(st.session_state.org_to_classify, typos=True)
+        ai_answer = current_ai_answer(st.session_state.org_to_classify, knn_threshold)
+        ai_sector, ai_reason, ai_source = ai_answer or (None, None, None)
 
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("### 📜 Rule-Based (Official)")
             if static_sector:
                 st.success(f"**{static_sector}**")
-                st.caption("Matched from a predefined NCSA list.")
+                matched_orgs = find_static_matches(st.session_state.org_to_classify)
+                if matched_orgs:
+                    st.caption("Matched from a predefined NCSA list: " + ", ".join(
+                        f"{org} ({' / '.join(labels)})" for org, labels in matched_orgs.items()
+                    ))
+                else:
+                    near_org, similarity = near_miss_match(st.session_state.org_to_classify)
+                    st.caption(f"Closest NCSA-listed name: {near_org} (similarity {similarity:.2f}).")
             else:
                 st.warning("**No Match**")
                 st.caption("Not found in predefined NCSA lists.")
         
         with col2:
             st.markdown("### 🤖 AI-Based (Characterization)")
-            if ai_sector:
+            if ai_answer is None:
+                wait_for_ai_answer()
+            elif ai_sector:
                 st.info(f"**{ai_sector}**")
                 st.caption(f"Reason: {ai_reason}")
+                st.caption(f"Answered by: {AI_SOURCE_LABELS.get(ai_source, ai_source)}")
+            elif ai_source == SOURCE_UNAVAILABLE:
+                st.warning("**AI Temporarily Unavailable**")
+                st.caption("Cohere is not responding, so this page shows the rule-based result only. AI classification resumes automatically once it recovers.")
             else:
                 st.warning("**No AI Classification**")
                 st.caption("AI could not determine a sector.")
@@ -333,40 +429,33 @@ def main_app():
         st.markdown("---")
 
         final_sectors = set()
-        if static_sector and static_sector in SECTOR_DETAILS:
+        if static_sector and static_sector in SECTOR_LABELS:
             final_sectors.add(static_sector)
-        if ai_sector and ai_sector in SECTOR_DETAILS:
+        if ai_sector and ai_sector in SECTOR_LABELS:
             final_sectors.add(ai_sector)
 
         if final_sectors:
-            display_unified_recommendations(list(final_sectors))
+            with metrics.span("recommendations_render"):
+                display_unified_recommendations(list(final_sectors))
             
             st.markdown("---")
             st.markdown("## ภาคผนวก: ข้อกำหนดเฉพาะหน่วยงานกำกับดูแล (Appendix)")
             
-            is_gov_related = any(s in ["Critical Infrastructure (CII)", "Government / SOE", "Regulator"] for s in final_sectors)
-            if is_gov_related:
-                df_law = load_csv_data('Cybersecurity_Law-Service_Mapping_Table.csv')
-                display_compliance_table(df_law, "📑 รายละเอียดข้อกำหนดตาม พ.ร.บ. ไซเบอร์ฯ", 'Cybersecurity_Law-Service_Mapping_Table.csv')
-
-            if "Banking / Finance / Insurance (BFSI)" in final_sectors:
-                org_name_lower = st.session_state.org_to_classify.lower()
-                
-                if any(keyword in org_name_lower for keyword in BANKING_KEYWORDS):
-                    df_bot = load_csv_data('BOT_Cybersecurity_Compliance_Mapping.csv')
-                    display_compliance_table(df_bot, "🏦 รายละเอียดข้อกำหนดตามแนวทางของธนาคารแห่งประเทศไทย (BOT)", 'BOT_Cybersecurity_Compliance_Mapping.csv')
-                
-                if any(keyword in org_name_lower for keyword in INSURANCE_KEYWORDS):
-                    df_oic = load_csv_data('OIC_Cybersecurity_Service_Mapping.csv')
-                    display_compliance_table(df_oic, "🛡️ รายละเอียดข้อกำหนดตามแนวทางของสำนักงาน คปภ. (OIC)", 'OIC_Cybersecurity_Service_Mapping.csv')
-                
-                if any(keyword in org_name_lower for keyword in SEC_KEYWORDS):
-                    df_sec = load_csv_data('SEC_Cybersecurity_Service_Mapping.csv')
-                    display_compliance_table(df_sec, "📈 รายละเอียดข้อกำหนดตามแนวทางของสำนักงาน ก.ล.ต. (SEC)", 'SEC_Cybersecurity_Service_Mapping.csv')
-                
+            with metrics.span("appendix_load"):
+                tables = compliance_appendix(final_sectors, st.session_state.org_to_classify)
+            with metrics.span("appendix_render"):
+                for table in tables:
+                    display_compliance_table(table)
+            display_service_lookup()
+
+        elif ai_answer is None:
+            st.info("Recommendations appear here once the AI classification arrives.")
         else:
             st.error("Could not determine a valid, mapped sector from any method to provide recommendations.")
 
 # --- Run the App ---
 if st.session_state["authenticated"]:
-    main_app()
+    # Attribute this session's Cohere calls to it so the shared rate limiter can queue sessions fairly
+    ctx = get_script_run_ctx()
+    with ai_session(ctx.session_id if ctx else "default"), get_metrics().span("page"):
+        main_app()
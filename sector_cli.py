@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Command-line sector classifier. Never imports Streamlit or pandas.
+
+    python sector_cli.py classify "ธนาคารกรุงไทย" "Acme Logistics"
+    python sector_cli.py classify --file leads.csv --out leads_sectors.csv
+    python sector_cli.py classify --no-ai --file names.txt
+    python sector_cli.py evaluate-local --holdout 0.2
+    python sector_cli.py compile-registry
+
+Results are printed as JSON lines. The Cohere key is read from COHERE_API_KEY.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+import sector_core
+from bulk_jobs import pick_name_column, write_enriched_csv
+from knn_classifier import evaluate
+from registry import RegistryError, compile_registry, load_snapshot, save_snapshot
+
+# Columns of classify --out, in order; classify_one() returns exactly these keys
+CLASSIFY_FIELDS = ["company_name", "static_sector", "ai_sector", "ai_reason", "ai_source", "sector", "key_services", "regulators"]
+
+
+def read_names_file(path):
+    """Returns (names, source rows, source columns) from a CSV with a header, or a plain one-name-per-line file."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.DictReader(handle)
+            rows = list(reader)
+            columns = reader.fieldnames or []
+        name_column = pick_name_column(columns)
+        return [(row.get(name_column) or "").strip() for row in rows], rows, columns
+    with open(path, encoding="utf-8-sig") as handle:
+        names = [line.strip() for line in handle if line.strip()]
+    return names, None, None
+
+
+def classify_one(name, use_ai, threshold=None):
+    static_sector = sector_core.classify_statically(name)
+    ai_sector, ai_reason, ai_source = sector_core.classify_ai_tiered(name, threshold) if use_ai else (None, None, None)
+    sector = static_sector or ai_sector
+    result = {"company_name": name, "static_sector": static_sector, "ai_sector": ai_sector, "ai_reason": ai_reason,
+              "ai_source": ai_source, "sector": sector}
+    result.update(sector_core.sector_enrichment(sector))
+    return result
+
+
+def print_result(result):
+    sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def cmd_classify(args):
+    use_ai = not args.no_ai
+    if use_ai:
+        try:
+            sector_core.get_api_key()
+        except RuntimeError as e:
+            print(f"error: {e} (or pass --no-ai)", file=sys.stderr)
+            return 2
+
+    if bool(args.file) == bool(args.names):
+        print("error: give either NAME... or --file", file=sys.stderr)
+        return 2
+    names, source_rows, source_columns = list(args.names), None, None
+    if args.file:
+        names, source_rows, source_columns = read_names_file(args.file)
+
+    if args.file and use_ai:
+        # Files go through the resumable bulk engine: concurrent AI calls, checkpointed rows
+        job_id = sector_core.run_bulk_classification(
+            names, on_result=lambda row_idx, result, resumed: print_result(result), concurrency=args.concurrency,
+            knn_threshold=args.threshold, batch=not args.no_batch,
+        )
+        if args.out:
+            store = sector_core.get_bulk_store()
+            write_enriched_csv(job_id, store, args.out, names, source_rows=source_rows, source_columns=source_columns)
+        return 0
+
+    results = [classify_one(name, use_ai, args.threshold) for name in names]
+    for result in results:
+        print_result(result)
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8-sig") as handle:
+            writer = csv.DictWriter(handle, fieldnames=CLASSIFY_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    return 0
+
+
+def cmd_evaluate_local(args):
+    if args.file:
+        with open(args.file, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.DictReader(handle)
+            columns = reader.fieldnames or []
+            name_column = pick_name_column(columns)
+            sector_column = "sector" if "sector" in columns else columns[-1]
+            labelled = [(row[name_column], row[sector_column]) for row in reader if row.get(sector_column)]
+    else:
+        labelled = sector_core.get_ai_cache().items()
+    if len(labelled) < 2:
+        print("error: need at least two LLM-labelled names (cached answers or --file)", file=sys.stderr)
+        return 2
+
+    report = evaluate(labelled, holdout=args.holdout, seed=args.seed)
+    print(f"trained on {report['train_size']} examples, evaluated on {report['holdout_size']} held-out LLM labels")
+    print(f"{'threshold':>9} | {'LLM calls avoided':>17} | {'agreement with LLM':>18}")
+    for row in report["thresholds"]:
+        agreement = "-" if row["agreement"] is None else f"{row['agreement']:.1%}"
+        marker = "  <- current" if abs(row["threshold"] - sector_core.KNN_CONFIDENCE_THRESHOLD) < 1e-9 else ""
+        print(f"{row['threshold']:>9.2f} | {row['llm_call_reduction']:>17.1%} | {agreement:>18}{marker}")
+    return 0
+
+
+def cmd_compile_registry(args):
+    start = time.perf_counter()
+    try:
+        registry = compile_registry(args.data_dir)
+    except RegistryError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    compiled = time.perf_counter() - start
+    save_snapshot(registry, args.out)
+    start = time.perf_counter()
+    load_snapshot(args.out)
+    loaded = time.perf_counter() - start
+    aliases = sum(len(names) for names in registry.aliases.values())
+    print(f"registry version {registry.version}: {len(registry):,} organizations, {aliases:,} aliases, "
+          f"{len(registry.sector_labels)} sectors")
+    print(f"compiled in {compiled:.2f}s; snapshot {args.out} loads in {loaded * 1e3:.0f} ms")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="sector_cli.py", description="Classify organizations into sectors.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    classify = subparsers.add_parser("classify", help="classify one or more organization names")
+    classify.add_argument("names", nargs="*", metavar="NAME", help="organization names to classify")
+    classify.add_argument("--file", help="CSV (with a header) or text file of names, one per line")
+    classify.add_argument("--out", help="write an enriched CSV to this path")
+    classify.add_argument("--no-ai", action="store_true", help="use only the static NCSA lists")
+    classify.add_argument("--concurrency", type=int, default=8, help="concurrent AI requests for --file (default: 8)")
+    classify.add_argument("--no-batch", action="store_true", help="send one AI request per name for --file")
+    classify.add_argument("--threshold", type=float, help="local model confidence needed to skip Cohere "
+                          f"(default: {sector_core.KNN_CONFIDENCE_THRESHOLD})")
+    classify.set_defaults(func=cmd_classify)
+
+    evaluate_local = subparsers.add_parser(
+        "evaluate-local", help="measure how many LLM calls the local model saves and how often it agrees")
+    evaluate_local.add_argument("--file", help="CSV of name,sector labels (default: cached LLM answers)")
+    evaluate_local.add_argument("--holdout", type=float, default=0.2, help="fraction held out for evaluation (default: 0.2)")
+    evaluate_local.add_argument("--seed", type=int, default=0)
+    evaluate_local.set_defaults(func=cmd_evaluate_local)
+
+    compile_parser = subparsers.add_parser(
+        "compile-registry", help="validate the registry data files and write the snapshot the app loads")
+    compile_parser.add_argument("--data-dir", default=sector_core.REGISTRY_DIR,
+                                help=f"registry data files (default: {sector_core.REGISTRY_DIR})")
+    compile_parser.add_argument("--out", default=sector_core.REGISTRY_SNAPSHOT,
+                                help=f"snapshot path (default: {sector_core.REGISTRY_SNAPSHOT})")
+    compile_parser.set_defaults(func=cmd_compile_registry)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
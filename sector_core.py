@@ -0,0 +1,940 @@
+# -*- coding: utf-8 -*-
+"""Headless sector classification core.
+
+Everything needed to classify an organization and look up its recommended
+services, without Streamlit or pandas. The Cohere SDK is imported and the
+client built only on the first AI call, so importing this module is cheap and
+safe from workers, cron jobs and the CLI (sector_cli.py).
+"""
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+from ai_cache import ClassificationCache, normalize_name, prompt_version
+from bulk_jobs import BulkJobStore, run_bulk_job
+from compliance_index import ComplianceIndex, ComplianceSource
+from knn_classifier import KnnClassifier
+from metrics import Metrics, serve_prometheus
+from registry import RegistryError, data_signature, load_registry, read_sector_details
+from resilience import CircuitBreaker, ProviderUnavailable, call_with_retries, call_with_retries_async
+from scheduler import CURRENT_SESSION, FairScheduler, SingleFlight, session_scope
+
+# --- Cohere client (built lazily) ---
+_api_key = None
+
+def configure(api_key):
+    """Sets the Cohere API key explicitly (e.g. from st.secrets); otherwise COHERE_API_KEY is read from the environment."""
+    global _api_key
+    _api_key = api_key
+    get_client.cache_clear()
+
+def get_api_key():
+    api_key = _api_key or os.environ.get("COHERE_API_KEY")
+    if not api_key:
+        raise RuntimeError("Cohere API key not configured. Set COHERE_API_KEY or call sector_core.configure().")
+    return api_key
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """Returns the shared cohere.Client, importing the SDK on first use."""
+    import cohere
+    # Timeouts and retries are applied per call by chat() below (see _request_options), not by the SDK
+    return cohere.Client(get_api_key(), timeout=AI_ATTEMPT_TIMEOUT_SECONDS)
+
+def make_async_client():
+    """Returns a new cohere.AsyncClient; async clients are bound to the event loop that uses them."""
+    import cohere
+    return cohere.AsyncClient(get_api_key(), timeout=AI_ATTEMPT_TIMEOUT_SECONDS)
+
+
+# --- Instrumentation ---
+@functools.lru_cache(maxsize=None)
+def get_metrics():
+    """Process-wide stage timings and counters.
+
+    SECTOR_METRICS_LOG appends every observation to a JSON-lines file; SECTOR_METRICS_PORT serves
+    Prometheus text at http://127.0.0.1:<port>/metrics.
+    """
+    metrics = Metrics(log_path=os.environ.get("SECTOR_METRICS_LOG") or None)
+    metrics.gauge_sources.append(lambda: {
+        f"ai_queue_{key}": value for key, value in ai_scheduler_stats().items() if isinstance(value, (int, float))
+    })
+    port = os.environ.get("SECTOR_METRICS_PORT")
+    if port:
+        try:
+            serve_prometheus(metrics, int(port))
+        except OSError as e:
+            # Another process (e.g. a second Streamlit worker) already serves the port
+            metrics.exporter_error = str(e)
+    return metrics
+
+def cached_ai_answer(company_name):
+    """AI cache lookup that also counts hits and misses."""
+    cached = get_ai_cache().get(company_name)
+    get_metrics().increment("ai_cache_lookups", result="hit" if cached is not None else "miss")
+    return cached
+
+def _record_cohere_call(kind, model, attempts, seconds, response=None, error=None):
+    metrics = get_metrics()
+    if attempts:
+        metrics.observe(f"cohere_{kind}", seconds)
+        metrics.increment("cohere_requests", attempts, model=model, kind=kind)
+        metrics.increment("cohere_retries", attempts - 1, model=model, kind=kind)
+    if error is not None:
+        metrics.increment("cohere_errors", model=model, kind=kind, reason=error)
+        return
+    billed = getattr(getattr(response, "meta", None), "billed_units", None)
+    metrics.increment("cohere_input_tokens", int(getattr(billed, "input_tokens", 0) or 0), model=model)
+    metrics.increment("cohere_output_tokens", int(getattr(billed, "output_tokens", 0) or 0), model=model)
+
+
+# --- Deadlines, retries and circuit breaker around co.chat ---
+# A single-name answer must arrive within AI_DEADLINE_SECONDS, retries included, which bounds how
+# long the page can wait on a slow provider; once the breaker opens it does not wait at all.
+AI_ATTEMPT_TIMEOUT_SECONDS = float(os.environ.get("SECTOR_AI_TIMEOUT", "6"))
+AI_DEADLINE_SECONDS = float(os.environ.get("SECTOR_AI_DEADLINE", "12"))
+AI_MAX_RETRIES = 2
+# Batched answers are long; give each request time for the output it asked for
+AI_SECONDS_PER_OUTPUT_TOKEN = 0.02
+AI_BREAKER = CircuitBreaker(failure_threshold=5, recovery_timeout=30.0)
+
+def ai_available():
+    """False while the circuit breaker is open, i.e. Cohere calls are being skipped."""
+    return AI_BREAKER.state != CircuitBreaker.OPEN
+
+def _chat_budget(kwargs):
+    """(deadline, attempt timeout) for a co.chat call; raises ProviderUnavailable while the breaker is open."""
+    if not ai_available():
+        raise ProviderUnavailable("AI provider circuit is open")
+    attempt_timeout = AI_ATTEMPT_TIMEOUT_SECONDS + (kwargs.get("max_tokens") or 0) * AI_SECONDS_PER_OUTPUT_TOKEN
+    return max(AI_DEADLINE_SECONDS, 2 * attempt_timeout), attempt_timeout
+
+def _request_options(timeout, waited):
+    """SDK options for an attempt allowed `timeout` seconds, `waited` of which went to the rate limiter."""
+    if waited >= timeout:
+        raise ProviderUnavailable("AI deadline exceeded")
+    # timeout_in_seconds and per-request max_retries are understood by every cohere 5.x-7.x release;
+    # "timeout" and Client(max_retries=) only by later ones, and older ones silently ignore "timeout"
+    return {"timeout_in_seconds": timeout - waited, "max_retries": 0}
+
+def _record_chat(kind, kwargs, attempts, start, response=None, error=None):
+    if error is not None:
+        error = "unavailable" if isinstance(error, ProviderUnavailable) else type(error).__name__
+    _record_cohere_call(kind, kwargs.get("model"), attempts, time.perf_counter() - start, response, error)
+
+def chat(kind="single", **kwargs):
+    """co.chat with a per-attempt timeout, jittered retries of transient errors and the shared breaker.
+
+    Every attempt, retries included, first waits for a slot from the shared rate limiter; the
+    wait counts against that attempt's time and the deadline. Raises ProviderUnavailable while
+    the breaker is open or once the deadline is spent. kind ("single" or "batch") labels the
+    call's metrics.
+    """
+    attempts = [0]
+
+    def attempt(timeout):
+        options = _request_options(timeout, get_ai_scheduler().acquire(timeout=timeout))
+        attempts[0] += 1
+        return get_client().chat(**kwargs, request_options=options)
+
+    start = time.perf_counter()
+    try:
+        response = call_with_retries(attempt, AI_BREAKER, *_chat_budget(kwargs), max_retries=AI_MAX_RETRIES)
+    except Exception as e:
+        _record_chat(kind, kwargs, attempts[0], start, error=e)
+        raise
+    _record_chat(kind, kwargs, attempts[0], start, response)
+    return response
+
+async def chat_async(aco, kind="single", **kwargs):
+    """Async twin of chat()."""
+    attempts = [0]
+
+    async def attempt(timeout):
+        options = _request_options(timeout, await get_ai_scheduler().acquire_async(timeout=timeout))
+        attempts[0] += 1
+        return await aco.chat(**kwargs, request_options=options)
+
+    start = time.perf_counter()
+    try:
+        response = await call_with_retries_async(attempt, AI_BREAKER, *_chat_budget(kwargs), max_retries=AI_MAX_RETRIES)
+    except Exception as e:
+        _record_chat(kind, kwargs, attempts[0], start, error=e)
+        raise
+    _record_chat(kind, kwargs, attempts[0], start, response)
+    return response
+
+
+# --- Shared scheduling of Cohere calls across sessions ---
+# Global request quota; set it a little under the plan's per-minute limit
+AI_RATE_PER_MINUTE = float(os.environ.get("SECTOR_AI_RATE_PER_MINUTE", "100"))
+AI_RATE_BURST = int(os.environ.get("SECTOR_AI_RATE_BURST", "10"))
+if AI_RATE_PER_MINUTE <= 0 or AI_RATE_BURST < 1:
+    # Fail at startup rather than with a ZeroDivisionError on the first queued call
+    raise ValueError("SECTOR_AI_RATE_PER_MINUTE must be above 0 and SECTOR_AI_RATE_BURST at least 1")
+
+@functools.lru_cache(maxsize=None)
+def get_ai_scheduler():
+    """The process-wide rate limiter every co.chat call queues on, fair between sessions."""
+    return FairScheduler(AI_RATE_PER_MINUTE / 60, AI_RATE_BURST)
+
+@functools.lru_cache(maxsize=None)
+def get_singleflight():
+    """Merges concurrent single-name lookups of the same company, from any session, into one call."""
+    return SingleFlight()
+
+def ai_session(session_id):
+    """Context manager attributing the Cohere calls made inside it to a session, for fair queuing."""
+    return session_scope(session_id)
+
+def ai_scheduler_stats():
+    """Queue depth, wait-time percentiles and call counts of the shared Cohere scheduler."""
+    stats = get_ai_scheduler().stats()
+    flight = get_singleflight()
+    stats.update(lookups_sent=flight.executed, lookups_coalesced=flight.coalesced)
+    return stats
+
+
+# --- Organization / sector registry (registry/*.csv, *.json) ---
+REGISTRY_DIR = os.environ.get("SECTOR_REGISTRY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "registry"))
+# Compiled snapshot (python sector_cli.py compile-registry); rewritten whenever the data files change
+REGISTRY_SNAPSHOT = os.environ.get("SECTOR_REGISTRY_SNAPSHOT", os.path.join(REGISTRY_DIR, "registry.snapshot"))
+# How often a running server looks for edited data files
+REGISTRY_CHECK_SECONDS = float(os.environ.get("SECTOR_REGISTRY_CHECK_SECONDS", "5"))
+
+# The sector labels shape the prompts and the AI cache key, so they are read once at import; a registry
+# edit that changes them is refused until restart. Org lists, aliases, keywords and details hot-reload.
+SECTOR_LABELS = list(read_sector_details(REGISTRY_DIR))
+
+_registry_lock = threading.Lock()
+_registry = None
+_registry_signature = None
+_registry_checked = 0.0
+_registry_reloading = False
+_registry_error = None
+
+def install_registry(registry):
+    """Makes `registry` the one every new lookup uses; lookups already running finish on the old one."""
+    global _registry
+    if registry.sector_labels != SECTOR_LABELS:
+        raise RegistryError("sectors.json changed the sector labels; restart to apply (prompts and cached AI answers depend on them)")
+    _registry = registry
+
+def _load_registry():
+    global _registry_signature, _registry_error
+    signature = data_signature(REGISTRY_DIR)
+    registry, compiled = load_registry(REGISTRY_DIR, REGISTRY_SNAPSHOT)
+    install_registry(registry)
+    _registry_signature = signature
+    _registry_error = None
+    get_metrics().increment("registry_loads", source="compiled" if compiled else "snapshot")
+
+def _reload_registry():
+    global _registry_signature, _registry_error, _registry_reloading
+    signature = data_signature(REGISTRY_DIR)
+    try:
+        _load_registry()
+    except Exception as e:
+        # Keep serving the last good registry; try again once the files change. Any error counts here,
+        # or the next check would start the same failing (and at scale, costly) recompile again
+        _registry_signature = signature
+        _registry_error = str(e) if isinstance(e, RegistryError) else f"{type(e).__name__}: {e}"
+        get_metrics().increment("registry_reload_errors")
+    finally:
+        _registry_reloading = False
+
+def get_registry():
+    """The current Registry, loaded on first use.
+
+    Afterwards edited data files are recompiled in a background thread and swapped in atomically,
+    so sessions neither wait for a rebuild nor see a half-built registry.
+    """
+    global _registry_checked, _registry_reloading
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _load_registry()
+        return _registry
+    now = time.monotonic()
+    if now - _registry_checked >= REGISTRY_CHECK_SECONDS:
+        with _registry_lock:
+            _registry_checked = now
+            if not _registry_reloading and data_signature(REGISTRY_DIR) != _registry_signature:
+                _registry_reloading = True
+                threading.Thread(target=_reload_registry, name="registry-reload", daemon=True).start()
+    return _registry
+
+def registry_status():
+    """Version and size of the registry in use, and the error of the last failed reload (if any)."""
+    registry = get_registry()
+    return {"version": registry.version, "organizations": len(registry), "reloading": _registry_reloading,
+            "error": _registry_error}
+
+def get_sector_details():
+    return get_registry().sector_details
+
+
+AI_MODEL = "command-r-plus"
+
+PROMPT_INSTRUCTION = f"""
+You are a sector classification assistant. Your task is to categorize a company into one of the following sectors based on its name and likely business activities:
+{', '.join(SECTOR_LABELS)}
+
+Provide your answer in a JSON format with two keys: "sector" and "reason". The "reason" should be a brief explanation for your choice.
+
+Example:
+Company: "Krungthai AXA"
+Output:
+{{"sector": "Banking / Finance / Insurance (BFSI)", "reason": "The name contains 'Krungthai' and 'AXA', which are strongly associated with banking and insurance."}}
+"""
+
+BATCH_PROMPT_INSTRUCTION = f"""
+You are a sector classification assistant. Your task is to categorize each of the numbered companies below into one of the following sectors based on its name and likely business activities:
+{', '.join(SECTOR_LABELS)}
+
+Provide your answer as a JSON array with one object per company and nothing else. Each object has three keys: "index" (the number in front of the company), "sector" and "reason". The "reason" should be a brief explanation for your choice.
+
+Example:
+Companies:
+0. Krungthai AXA
+1. Bangkok Dusit Medical Services
+Output:
+[{{"index": 0, "sector": "Banking / Finance / Insurance (BFSI)", "reason": "The name contains 'Krungthai' and 'AXA', which are strongly associated with banking and insurance."}}, {{"index": 1, "sector": "Healthcare", "reason": "Operates hospitals and medical services."}}]
+"""
+
+# Any change to the prompts, the sector labels or the model invalidates cached AI answers
+PROMPT_VERSION = prompt_version(AI_MODEL, PROMPT_INSTRUCTION, BATCH_PROMPT_INSTRUCTION, SECTOR_LABELS)
+
+@functools.lru_cache(maxsize=None)
+def get_ai_cache():
+    """Opens the on-disk AI result cache once per process and shares it across sessions."""
+    return ClassificationCache(version=PROMPT_VERSION)
+
+def get_static_matcher():
+    """The NCSA lists as one automaton; manifest precedence decides ties (CII > Regulator > Gov)."""
+    return get_registry().static_matcher
+
+def get_fuzzy_index():
+    """Typo-tolerant index over the listed organizations and their aliases."""
+    return get_registry().fuzzy_index
+
+# Enough for every realistic keyword today; keeps the button list and lookup cost bounded at registry scale
+MAX_SUGGESTIONS = 50
+
+def search_orgs(keyword, k=MAX_SUGGESTIONS):
+    """Returns up to k (listed org, score) pairs for a partial, misspelt or abbreviated name, best first."""
+    return get_fuzzy_index().ranked_search(keyword, k=k)
+
+def find_suggestions(keyword):
+    """Searches the combined static list for names matching the keyword, best match first."""
+    return [org for org, _ in search_orgs(keyword)]
+
+def find_static_matches(entity_name):
+    """Returns {NCSA org name: [sector labels]} for every listed org contained in the name."""
+    return get_static_matcher().match(entity_name)
+
+def near_miss_match(entity_name):
+    """Returns (listed org, similarity) for a name that misses the lists only by an alias or typo, else None."""
+    return get_fuzzy_index().best_match(entity_name)
+
+def classify_statically(entity_name, typos=False):
+    """Sector of the NCSA list that names the organization, or None.
+
+    Matches listed names contained in the text, then a name that is just an alias; both cost the
+    same at any registry size. typos=True also accepts a listed name misspelt by a few edits,
+    which is much slower and meant for the interactive single lookup, not for bulk runs.
+    """
+    # One registry for the whole lookup, even if a reload swaps it meanwhile
+    registry = get_registry()
+    sector = registry.static_matcher.classify(entity_name)
+    if sector is None:
+        if typos:
+            near_miss = registry.fuzzy_index.best_match(entity_name)
+            target = near_miss[0] if near_miss else None
+        else:
+            target = registry.fuzzy_index.alias_match(entity_name)
+        if target:
+            sector = registry.static_matcher.classify(target)
+    return sector
+
+def get_mapped_sector_from_ai_response(ai_sector_name):
+    if not ai_sector_name:
+        return None
+    if ai_sector_name in SECTOR_LABELS:
+        return ai_sector_name
+    for key in SECTOR_LABELS:
+        if ai_sector_name.lower() in key.lower():
+            return key
+    return None
+
+def parse_ai_response(response_text):
+    """Extracts (mapped sector, reason) from the model's JSON answer. Raises on malformed output."""
+    cleaned_json_str = re.sub(r"```json|```", "", response_text).strip()
+    parsed_json = json.loads(cleaned_json_str)
+    raw_ai_sector = parsed_json.get("sector", "").strip()
+    mapped_sector = get_mapped_sector_from_ai_response(raw_ai_sector)
+    reason = parsed_json.get("reason", "No reason provided by AI.")
+    return mapped_sector, reason
+
+def remember_ai_result(company_name, sector, reason):
+    """Stores an LLM answer in the cache, which also makes it a training example for the local model."""
+    global _new_examples
+    get_ai_cache().set(company_name, sector, reason, model=AI_MODEL)
+    with _knn_lock:
+        _new_examples += 1
+
+def ask_ai(company_name):
+    """classify_with_ai without the error handling: raises ProviderUnavailable or the provider's error."""
+    cached = cached_ai_answer(company_name)
+    if cached is not None:
+        return cached
+    return ask_cohere(company_name)
+
+def ask_cohere(company_name):
+    """ask_ai minus the cache lookup; concurrent calls for the same name share one request."""
+    return get_singleflight().do(normalize_name(company_name), lambda: _ask_cohere(company_name))
+
+def _single_request(company_name):
+    """co.chat arguments asking for one company's sector."""
+    return {"model": AI_MODEL, "message": f"{PROMPT_INSTRUCTION}\nCompany: {company_name}", "temperature": 0.3}
+
+def _single_answer(company_name, response):
+    """(sector, reason) from a single-company response, cached when usable; (None, None) if it cannot be parsed."""
+    try:
+        mapped_sector, reason = parse_ai_response(response.text)
+    except (ValueError, AttributeError):
+        get_metrics().increment("cohere_parse_failures", kind="single")
+        return None, None
+    if mapped_sector:
+        remember_ai_result(company_name, mapped_sector, reason)
+    return mapped_sector, reason
+
+def _ask_cohere(company_name):
+    return _single_answer(company_name, chat(**_single_request(company_name)))
+
+def classify_with_ai(company_name):
+    try:
+        return ask_ai(company_name)
+    except Exception:
+        return None, None
+
+async def classify_with_ai_async(aco, company_name):
+    """Async twin of classify_with_ai for bulk jobs; shares the same on-disk cache."""
+    cached = cached_ai_answer(company_name)
+    if cached is not None:
+        return cached
+    try:
+        response = await chat_async(aco, **_single_request(company_name))
+    except Exception:
+        return None, None
+    return _single_answer(company_name, response)
+
+# --- Batched AI classification ---
+# Names per request are bounded by both an input budget and the output they will need
+BATCH_INPUT_TOKEN_BUDGET = 1500
+BATCH_OUTPUT_TOKENS_PER_ITEM = 80
+BATCH_MAX_OUTPUT_TOKENS = 4000
+BATCH_MAX_ITEMS = BATCH_MAX_OUTPUT_TOKENS // BATCH_OUTPUT_TOKENS_PER_ITEM
+# Rounds of re-batching the items a response dropped or garbled before asking for them one at a time
+BATCH_RETRY_ROUNDS = 2
+
+def estimate_tokens(text):
+    """Rough, deliberately high token estimate: about one token per Thai character or three bytes of Latin text."""
+    return max(1, len(text.encode("utf-8")) // 3)
+
+def plan_batches(names, input_budget=BATCH_INPUT_TOKEN_BUDGET, max_items=BATCH_MAX_ITEMS):
+    """Greedily packs names (kept in order) into batches that fit the per-request budgets."""
+    batches, current, used = [], [], 0
+    for name in names:
+        cost = estimate_tokens(name) + 3  # "12. " prefix and newline
+        if current and (used + cost > input_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(name)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def build_batch_message(names):
+    numbered = "\n".join(f"{i}. {name}" for i, name in enumerate(names))
+    return f"{BATCH_PROMPT_INSTRUCTION}\nCompanies:\n{numbered}"
+
+def parse_batch_response(response_text, count):
+    """Returns {index: (mapped sector, reason)} for every valid element of the model's JSON array.
+
+    Elements with an unknown index or an unmappable sector are dropped so the caller can re-query
+    them. A truncated array still yields the objects that were completed.
+    """
+    cleaned = re.sub(r"```json|```", "", response_text).strip()
+    try:
+        items = json.loads(cleaned[cleaned.index("["):cleaned.rindex("]") + 1])
+    except ValueError:
+        items = []
+        for fragment in re.findall(r"\{[^{}]*\}", cleaned):
+            try:
+                items.append(json.loads(fragment))
+            except ValueError:
+                continue
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("index"))
+        except (TypeError, ValueError):
+            continue
+        sector = get_mapped_sector_from_ai_response(str(item.get("sector") or "").strip())
+        if 0 <= index < count and sector and index not in results:
+            results[index] = (sector, item.get("reason") or "No reason provided by AI.")
+    return results
+
+def record_usage(usage, response, requests=1):
+    """Adds a response's billed tokens to a usage dict, when the caller passed one."""
+    if usage is None:
+        return
+    billed = getattr(getattr(response, "meta", None), "billed_units", None)
+    usage["requests"] = usage.get("requests", 0) + requests
+    usage["input_tokens"] = usage.get("input_tokens", 0) + int(getattr(billed, "input_tokens", 0) or 0)
+    usage["output_tokens"] = usage.get("output_tokens", 0) + int(getattr(billed, "output_tokens", 0) or 0)
+
+def _batch_request(names):
+    """co.chat arguments asking for several companies' sectors in one JSON array."""
+    return {
+        "kind": "batch",
+        "model": AI_MODEL,
+        "message": build_batch_message(names),
+        "temperature": 0.3,
+        "max_tokens": min(BATCH_MAX_OUTPUT_TOKENS, BATCH_OUTPUT_TOKENS_PER_ITEM * len(names) + 100),
+    }
+
+def _batch_answers(names, response, usage=None):
+    """{index: (sector, reason)} for the valid items of a batched response; adds its tokens to usage."""
+    record_usage(usage, response)
+    parsed = parse_batch_response(response.text, len(names))
+    # Items a batch dropped or garbled; they are re-queried, but each one is a parse failure
+    get_metrics().increment("cohere_parse_failures", len(names) - len(parsed), kind="batch")
+    return parsed
+
+def classify_batch_with_ai(names, usage=None):
+    """Classifies several names in one co.chat call. Returns {index: (sector, reason)} for valid answers."""
+    try:
+        response = chat(**_batch_request(names))
+    except Exception:
+        return {}
+    return _batch_answers(names, response, usage)
+
+async def classify_batch_with_ai_async(aco, names, usage=None):
+    """Async twin of classify_batch_with_ai."""
+    try:
+        response = await chat_async(aco, **_batch_request(names))
+    except Exception:
+        return {}
+    return _batch_answers(names, response, usage)
+
+def classify_many_with_ai(company_names, usage=None):
+    """Batched classify_with_ai: returns [(sector, reason)] aligned with company_names.
+
+    Cached names are answered locally, duplicates are asked once, and the rest are packed into as few
+    requests as the token budgets allow. Items a response drops or garbles are re-batched, in smaller
+    batches each round, and finally asked one at a time.
+    """
+    answers = {}
+    pending = []
+    seen = set()
+    for name in company_names:
+        key = normalize_name(name)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        cached = cached_ai_answer(name)
+        if cached is not None:
+            answers[key] = cached
+        else:
+            pending.append(name)
+
+    max_items = BATCH_MAX_ITEMS
+    for _ in range(1 + BATCH_RETRY_ROUNDS):
+        if not pending:
+            break
+        failed = []
+        for batch in plan_batches(pending, max_items=max_items):
+            parsed = classify_batch_with_ai(batch, usage)
+            for i, name in enumerate(batch):
+                if i in parsed:
+                    sector, reason = parsed[i]
+                    remember_ai_result(name, sector, reason)
+                    answers[normalize_name(name)] = (sector, reason)
+                else:
+                    failed.append(name)
+        pending = failed
+        max_items = max(1, max_items // 2)
+
+    for name in pending:
+        answers[normalize_name(name)] = classify_with_ai(name)
+        if usage is not None:
+            usage["single_requests"] = usage.get("single_requests", 0) + 1
+    return [answers.get(normalize_name(name), (None, None)) for name in company_names]
+
+class AsyncBatcher:
+    """Collects concurrent single-name requests from the bulk engine into batched calls.
+
+    Each classify() call waits at most `max_wait` seconds for other names to share its request; a
+    batch is sent as soon as it is full. At most `concurrency` requests are in flight.
+    """
+
+    def __init__(self, aco, concurrency=8, max_wait=0.05, usage=None):
+        import asyncio
+        self._asyncio = asyncio
+        self.aco = aco
+        self.max_wait = max_wait
+        self.usage = usage
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._waiting = []
+        self._timer = None
+
+    async def classify(self, name):
+        future = self._asyncio.get_running_loop().create_future()
+        self._waiting.append((name, future))
+        if len(plan_batches([n for n, _ in self._waiting])) > 1:
+            # The newest name overflowed the budget: send everything before it now
+            self._flush(len(self._waiting) - 1)
+        elif self._timer is None:
+            self._timer = self._asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self, upto=None):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        upto = len(self._waiting) if upto is None else upto
+        batch, self._waiting = self._waiting[:upto], self._waiting[upto:]
+        if self._waiting:
+            self._timer = self._asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        if batch:
+            self._asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch):
+        names = [name for name, _ in batch]
+        async with self._semaphore:
+            parsed = await classify_batch_with_ai_async(self.aco, names, self.usage)
+        for i, (name, future) in enumerate(batch):
+            if i in parsed:
+                remember_ai_result(name, *parsed[i])
+                future.set_result(parsed[i])
+            else:
+                # Dropped or garbled in the batch: ask for this one on its own
+                future.set_result(await classify_with_ai_async(self.aco, name))
+
+
+# --- Local nearest-neighbour pre-classifier ---
+# Below this confidence the local model defers to Cohere; tune with SECTOR_KNN_THRESHOLD
+KNN_CONFIDENCE_THRESHOLD = float(os.environ.get("SECTOR_KNN_THRESHOLD", "0.6"))
+# Retrain once this many new LLM answers (or 10% of the training set) have accumulated
+KNN_REBUILD_MIN = 20
+
+# Which path produced an AI-column answer
+SOURCE_CACHE = "cache"
+SOURCE_LOCAL = "local model"
+SOURCE_COHERE = "cohere"
+# Cohere was skipped or failed (breaker open, deadline spent, provider error)
+SOURCE_UNAVAILABLE = "unavailable"
+
+_knn_build_lock = threading.Lock()
+_knn_lock = threading.Lock()
+_knn_model = None
+_knn_retraining = False
+_new_examples = 0
+
+def local_training_examples():
+    """(name, sector, weight) for every cached LLM answer.
+
+    The NCSA list labels are left out: they say which list a name is on, not what the organization
+    does, and the AI column must not answer with them.
+    """
+    return [(name, sector, 1.0) for name, sector in get_ai_cache().items()]
+
+def _retrain_knn():
+    global _knn_model, _knn_retraining
+    try:
+        _knn_model = KnnClassifier(local_training_examples())
+    finally:
+        _knn_retraining = False
+
+def get_knn_classifier():
+    """Returns the local model, trained on first use.
+
+    Once enough new LLM answers have been cached it is retrained in a background thread and swapped
+    in when done; lookups keep using the current model meanwhile.
+    """
+    global _knn_model, _new_examples, _knn_retraining
+    model = _knn_model
+    if model is None:
+        with _knn_build_lock:
+            if _knn_model is None:
+                with _knn_lock:
+                    _new_examples = 0
+                _knn_model = KnnClassifier(local_training_examples())
+            return _knn_model
+    with _knn_lock:
+        retrain = not _knn_retraining and _new_examples >= max(KNN_REBUILD_MIN, len(model) // 10)
+        if retrain:
+            _knn_retraining = True
+            _new_examples = 0
+    if retrain:
+        threading.Thread(target=_retrain_knn, name="knn-retrain", daemon=True).start()
+    return model
+
+def predict_locally(company_name, threshold=None):
+    """Returns (sector, reason) from the local model if it is confident enough, else None."""
+    threshold = KNN_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    prediction = get_knn_classifier().predict(company_name)
+    if prediction is None or prediction.confidence < threshold:
+        return None
+    similar = ", ".join(name for name, sector, _ in prediction.neighbours[:3] if sector == prediction.sector)
+    reason = f"Similar to previously classified organizations: {similar} (confidence {prediction.confidence:.2f})."
+    return prediction.sector, reason
+
+def classify_ai_tiered(company_name, threshold=None):
+    """AI-column classification via the cheapest path that can answer: cache, local model, then Cohere.
+
+    Returns (sector, reason, source); source is SOURCE_UNAVAILABLE when Cohere could not be reached
+    in time and None when it answered without a usable sector.
+    """
+    answer = _answer_without_cohere(company_name, threshold)
+    if answer is None:
+        try:
+            sector, reason = ask_cohere(company_name)
+            answer = sector, reason, SOURCE_COHERE if (sector or reason) else None
+        except Exception:
+            answer = None, None, SOURCE_UNAVAILABLE
+    get_metrics().increment("ai_answers", source=answer[2] or "none")
+    return answer
+
+def lookup_ai_answer(company_name, threshold=None):
+    """classify_ai_tiered() without the Cohere call: the cache's or a confident local model's answer, else None."""
+    answer = _answer_without_cohere(company_name, threshold)
+    if answer is not None:
+        get_metrics().increment("ai_answers", source=answer[2])
+    return answer
+
+def _answer_without_cohere(company_name, threshold):
+    cached = cached_ai_answer(company_name)
+    if cached is not None:
+        if _take_prefetched(company_name):
+            get_metrics().increment("ai_prefetch", result="used")
+        return cached[0], cached[1], SOURCE_CACHE
+    local = predict_locally(company_name, threshold)
+    if local is not None:
+        return local[0], local[1], SOURCE_LOCAL
+    return None
+
+
+# --- Background AI lookups and speculative prefetch ---
+# Threads that run clicked names' Cohere calls off the Streamlit script thread
+AI_LOOKUP_WORKERS = int(os.environ.get("SECTOR_AI_LOOKUP_WORKERS", "8"))
+# How many of the top suggestions of a search are classified before anyone clicks them
+PREFETCH_TOP_N = int(os.environ.get("SECTOR_PREFETCH_TOP_N", "3"))
+PREFETCH_WORKERS = int(os.environ.get("SECTOR_PREFETCH_WORKERS", "2"))
+# Cohere calls per minute that speculation may spend across all sessions; 0 turns prefetching off
+PREFETCH_BUDGET_PER_MINUTE = float(os.environ.get("SECTOR_PREFETCH_BUDGET_PER_MINUTE", "20"))
+# Speculative lookups waiting for a worker; further suggestions are not prefetched
+PREFETCH_MAX_PENDING = 20
+# Session name speculative calls are queued under in the shared rate limiter
+PREFETCH_SESSION = "prefetch"
+
+_prefetch_lock = threading.Lock()
+_prefetch_pending = set()
+# Names answered by Cohere through prefetch and not yet clicked (bounded, oldest dropped first)
+_prefetched = {}
+_PREFETCHED_MAX = 1000
+
+@functools.lru_cache(maxsize=None)
+def get_lookup_pool():
+    # Imported on first use; the CLI never needs the pools
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=AI_LOOKUP_WORKERS, thread_name_prefix="ai-lookup")
+
+@functools.lru_cache(maxsize=None)
+def get_prefetch_pool():
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="ai-prefetch")
+
+@functools.lru_cache(maxsize=None)
+def get_prefetch_budget():
+    """Token bucket for speculative Cohere calls, separate from (and on top of) the shared rate limit."""
+    rate = PREFETCH_BUDGET_PER_MINUTE / 60.0
+    return FairScheduler(rate=rate, burst=max(1, PREFETCH_TOP_N)) if rate > 0 else None
+
+def classify_ai_in_background(company_name, threshold=None):
+    """Runs classify_ai_tiered() on the lookup pool on behalf of the calling session; returns its Future."""
+    session = CURRENT_SESSION.get()
+
+    def run():
+        with session_scope(session), get_metrics().span("ai_classify"):
+            return classify_ai_tiered(company_name, threshold)
+
+    return get_lookup_pool().submit(run)
+
+def prefetch_ai_answers(names, threshold=None):
+    """Speculatively classifies the first PREFETCH_TOP_N names in the background, within the prefetch budget.
+
+    Answers land in the AI cache, so a later click on one of them renders from the cache; a click while its
+    prefetch is still running joins that Cohere call instead of sending another. Returns how many were queued.
+    """
+    if get_prefetch_budget() is None:
+        return 0
+    queued = 0
+    for name in names[:PREFETCH_TOP_N]:
+        key = normalize_name(name)
+        with _prefetch_lock:
+            if key in _prefetch_pending or len(_prefetch_pending) >= PREFETCH_MAX_PENDING:
+                continue
+            _prefetch_pending.add(key)
+        get_prefetch_pool().submit(_prefetch_one, name, key, threshold)
+        queued += 1
+    return queued
+
+def _prefetch_one(name, key, threshold):
+    metrics = get_metrics()
+    try:
+        # Cheap answers need no speculation; a click finds them just as fast
+        if get_ai_cache().get(name) is not None:
+            result = "cached"
+        elif predict_locally(name, threshold) is not None:
+            result = "local"
+        elif not ai_available() or not get_prefetch_budget().try_acquire():
+            result = "skipped"
+        else:
+            with session_scope(PREFETCH_SESSION):
+                sector, _ = ask_cohere(name)
+            result = "fetched" if sector else "no_answer"
+            if sector:
+                with _prefetch_lock:
+                    _prefetched[key] = True
+                    if len(_prefetched) > _PREFETCHED_MAX:
+                        del _prefetched[next(iter(_prefetched))]
+    except Exception:
+        result = "failed"
+    finally:
+        with _prefetch_lock:
+            _prefetch_pending.discard(key)
+    metrics.increment("ai_prefetch", result=result)
+
+def _take_prefetched(company_name):
+    """True (once) if this name's cached answer was fetched speculatively."""
+    with _prefetch_lock:
+        return _prefetched.pop(normalize_name(company_name), None) is not None
+
+def sector_enrichment(sector):
+    """Flattens the registry's details of a sector into CSV-friendly columns."""
+    details = get_sector_details().get(sector, {})
+    return {
+        "key_services": "; ".join(details.get("key_services", [])),
+        "regulators": "; ".join(details.get("regulators", [])),
+    }
+
+
+def aggregate_recommendations(sectors):
+    """Merges the registry's details of several sectors into sorted, de-duplicated lists."""
+    merged = {"key_services": set(), "secondary_opportunities": set(), "compliance_drivers": set(), "regulators": set()}
+    sector_details = get_sector_details()
+    for sector in sectors:
+        details = sector_details.get(sector)
+        if not details:
+            continue
+        for field, values in merged.items():
+            values.update(details.get(field, []))
+    return {field: sorted(values) for field, values in merged.items()}
+
+
+# --- Regulator compliance mappings (appendix) ---
+COMPLIANCE_DIR = os.environ.get("SECTOR_COMPLIANCE_DIR", os.path.dirname(os.path.abspath(__file__)))
+COMPLIANCE_SOURCES = [
+    ComplianceSource("NCSA", "Cybersecurity_Law-Service_Mapping_Table.csv", "Ref Code", "Topic", "Service Mapping"),
+    ComplianceSource("BOT", "BOT_Cybersecurity_Compliance_Mapping.csv", "รหัสหมวด BOT", "หัวข้อ BOT",
+                     "Cybersecurity Service Mapping", "ประเภทบริการ"),
+    ComplianceSource("OIC", "OIC_Cybersecurity_Service_Mapping.csv", "ข้อ", "หัวข้อ (Domain)", "Cybersecurity Service Mapping"),
+    ComplianceSource("SEC", "SEC_Cybersecurity_Service_Mapping.csv", "อ้างอิงข้อบังคับ", "หัวข้อ (Domain)",
+                     "Cybersecurity Service Mapping"),
+]
+# Regulator tables shown in the appendix for each sector
+SECTOR_REGULATOR_TABLES = {
+    "Critical Infrastructure (CII)": ["NCSA"],
+    "Government / SOE": ["NCSA"],
+    "Regulator": ["NCSA"],
+    "Banking / Finance / Insurance (BFSI)": ["BOT", "OIC", "SEC"],
+}
+_compliance_lock = threading.Lock()
+_compliance_index = None
+_compliance_registry = None
+
+def get_compliance_index():
+    """Returns the compliance index, rebuilding it when a mapping CSV or the registry changed."""
+    global _compliance_index, _compliance_registry
+    registry = get_registry()
+    with _compliance_lock:
+        if _compliance_index is None or _compliance_registry is not registry or _compliance_index.is_stale():
+            get_metrics().increment("compliance_index_builds")
+            # regulator_keywords gates BOT / OIC / SEC tables on the organization name
+            _compliance_index = ComplianceIndex(
+                COMPLIANCE_SOURCES, SECTOR_REGULATOR_TABLES, registry.regulator_keywords, base_dir=COMPLIANCE_DIR,
+            )
+            _compliance_registry = registry
+        return _compliance_index
+
+def compliance_appendix(sectors, org_name):
+    """RegulatorTables of requirements that apply to an organization in these sectors."""
+    return get_compliance_index().appendix(sectors, org_name)
+
+def compliance_services():
+    """Every service named in a regulator mapping, sorted."""
+    return get_compliance_index().service_names()
+
+def clauses_for_service(service):
+    """Regulator clauses (Clause tuples) whose mapping calls for a service."""
+    return get_compliance_index().clauses_for_service(service)
+
+
+# --- Bulk classification API ---
+@functools.lru_cache(maxsize=None)
+def get_bulk_store():
+    """Opens the bulk-job checkpoint store once per process."""
+    return BulkJobStore()
+
+def run_bulk_classification(names, on_result=None, concurrency=8, ai_for_static_hits=False, store=None,
+                            knn_threshold=None, batch=True):
+    """Classifies a list of names with the resumable bulk engine and returns the job id.
+
+    Names the local model is confident about (see predict_locally) never reach Cohere. With batch=True
+    the remaining names are packed into multi-company requests; concurrency then counts requests.
+    """
+    import asyncio
+
+    aco = make_async_client()
+    batcher = []
+
+    async def classify_ai(name):
+        cached = cached_ai_answer(name)
+        if cached is not None:
+            return cached
+        # The nearest-neighbour search is CPU work too; keep it off the event loop
+        local = await asyncio.to_thread(predict_locally, name, knn_threshold)
+        if local is not None:
+            get_metrics().increment("ai_answers", source=SOURCE_LOCAL)
+            return local
+        if not batch:
+            return await classify_with_ai_async(aco, name)
+        if not batcher:
+            batcher.append(AsyncBatcher(aco, concurrency=concurrency))
+        return await batcher[0].classify(name)
+
+    return run_bulk_job(
+        names, classify_statically, classify_ai, sector_enrichment, store or get_bulk_store(),
+        on_result=on_result, concurrency=concurrency * BATCH_MAX_ITEMS if batch else concurrency,
+        ai_for_static_hits=ai_for_static_hits,
+        options={"knn_threshold": KNN_CONFIDENCE_THRESHOLD if knn_threshold is None else knn_threshold},
+    )
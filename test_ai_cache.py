@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""ClassificationCache keys, prompt-version invalidation, TTL expiry and LRU eviction."""
+import types
+
+import pytest
+
+import ai_cache
+from ai_cache import ClassificationCache, normalize_name, prompt_version
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = types.SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(ai_cache, "time", types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def open_cache(tmp_path, **kwargs):
+    return ClassificationCache(path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("ธนาคารกรุงไทย", "ธนาคารกรุงไทย"),
+    (" ธนาคาร กรุงไทย ฯ", "ธนาคารกรุงไทย"),
+    ("ธนาคาร\u200bกรุงไทย\ufeff", "ธนาคารกรุงไทย"),
+    ("  Krungthai   BANK, (PCL.) ", "krungthai bank pcl"),
+    ("ＫＴＢ", "ktb"),
+    ("", ""),
+    (None, ""),
+])
+def test_normalize_name(raw, expected):
+    assert normalize_name(raw) == expected
+
+
+def test_prompt_version_tracks_every_part():
+    assert prompt_version("model", "prompt", ["A", "B"]) == prompt_version("model", "prompt", ["A", "B"])
+    assert prompt_version("model", "prompt", ["A", "B"]) != prompt_version("model", "prompt", ["A", "C"])
+    assert prompt_version("model", "prompt") != prompt_version("other", "prompt")
+
+
+def test_hits_the_same_entry_through_normalization(tmp_path, clock):
+    cache = open_cache(tmp_path, version="v1")
+    cache.set("ธนาคารกรุงไทย", "BFSI", "A bank.")
+    assert cache.get(" ธนาคาร กรุงไทย ฯ") == ("BFSI", "A bank.")
+    assert cache.get("ธนาคารกรุงเทพ") is None
+    assert cache.get("") is None
+
+
+def test_another_prompt_version_is_a_miss_and_purged(tmp_path, clock):
+    open_cache(tmp_path, version="v1").set("KTB", "BFSI", "A bank.")
+    assert open_cache(tmp_path, version="v1").get("KTB") == ("BFSI", "A bank.")
+    upgraded = open_cache(tmp_path, version="v2")
+    assert len(upgraded) == 0
+    assert upgraded.get("KTB") is None
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = open_cache(tmp_path, version="v1", ttl_seconds=60)
+    cache.set("KTB", "BFSI", "A bank.")
+    clock.value += 59
+    assert cache.get("KTB") == ("BFSI", "A bank.")
+    assert cache.items() == [("KTB", "BFSI")]
+    clock.value += 2
+    assert cache.items() == []
+    assert cache.get("KTB") is None
+    assert len(cache) == 0
+
+
+def test_evicts_the_least_recently_used(tmp_path, clock):
+    cache = open_cache(tmp_path, version="v1", max_entries=2)
+    cache.set("a", "A", "")
+    clock.value += 1
+    cache.set("b", "B", "")
+    clock.value += 1
+    assert cache.get("a") == ("A", "")
+    clock.value += 1
+    cache.set("c", "C", "")
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == ("A", "")
+    assert cache.get("c") == ("C", "")
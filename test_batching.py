@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Batched AI classification: budget packing, tolerant parsing, and re-querying only what a batch missed."""
+import json
+
+import cohere_stub
+import sector_core
+from sector_core import parse_batch_response, plan_batches
+
+BFSI = "Banking / Finance / Insurance (BFSI)"
+HEALTH = "Healthcare"
+
+
+class DroppingStub(cohere_stub.StubCohere):
+    """Leaves the given names out of the first batched answer that contains them."""
+
+    def __init__(self, drop):
+        super().__init__()
+        self.drop = set(drop)
+        self.messages = []
+
+    def _answer(self, message):
+        self.messages.append(message)
+        response, delay = super()._answer(message)
+        if "\nCompanies:\n" in message:
+            names = [line.split(". ", 1)[1] for line in message.rsplit("\nCompanies:\n", 1)[1].splitlines()]
+            items = [item for item in json.loads(response.text) if names[item["index"]] not in self.drop]
+            self.drop -= set(names)
+            response.text = json.dumps(items, ensure_ascii=False)
+        return response, delay
+
+
+def test_plan_batches_keeps_order_within_both_budgets():
+    names = [f"Company {i}" for i in range(10)]
+    cost = sector_core.estimate_tokens(names[0]) + 3
+    assert plan_batches(names, input_budget=cost * 4) == [names[0:4], names[4:8], names[8:10]]
+    assert plan_batches(names, max_items=3) == [names[0:3], names[3:6], names[6:9], names[9:10]]
+    # A name over the whole budget still goes out, alone
+    assert plan_batches(["x" * 100, "y"], input_budget=5) == [["x" * 100], ["y"]]
+    assert plan_batches([]) == []
+
+
+def test_parse_batch_response_keeps_valid_items_only():
+    text = json.dumps([
+        {"index": 0, "sector": BFSI, "reason": "bank"},
+        {"index": 1, "sector": "Space Mining", "reason": "?"},
+        {"index": 2, "sector": "healthcare", "reason": "hospital"},
+        {"index": 2, "sector": BFSI, "reason": "duplicate"},
+        {"index": 7, "sector": BFSI, "reason": "out of range"},
+        {"index": "x", "sector": BFSI},
+        "not an object",
+    ])
+    assert parse_batch_response(f"```json\n{text}\n```", 3) == {0: (BFSI, "bank"), 2: (HEALTH, "hospital")}
+
+
+def test_parse_batch_response_salvages_a_truncated_array():
+    text = f'[{{"index": 0, "sector": "{BFSI}", "reason": "bank"}}, {{"index": 1, "sector": "{HEALTH}", "rea'
+    assert parse_batch_response(text, 2) == {0: (BFSI, "bank")}
+    assert parse_batch_response("no json at all", 2) == {}
+
+
+def test_classify_many_requeries_only_the_missing_items(cohere):
+    stub = DroppingStub(drop={"โรงพยาบาลศิริราช"})
+    cohere_stub.install(stub)
+    sector_core.remember_ai_result("ธนาคารกรุงเทพ", BFSI, "cached")
+    names = ["ธนาคารกรุงไทย", "โรงพยาบาลศิริราช", "ธนาคาร กรุงไทย", "ธนาคารกรุงเทพ"]
+    usage = {}
+
+    answers = sector_core.classify_many_with_ai(names, usage)
+
+    assert [sector for sector, _ in answers] == [BFSI, HEALTH, BFSI, BFSI]
+    assert answers[3] == (BFSI, "cached")
+    # One batch for the two uncached, distinct names, then one for the item it dropped
+    assert len(stub.messages) == 2
+    assert "0. ธนาคารกรุงไทย\n1. โรงพยาบาลศิริราช" in stub.messages[0]
+    assert stub.messages[1].endswith("Companies:\n0. โรงพยาบาลศิริราช")
+    assert usage["requests"] == 2 and not usage.get("single_requests")
+    assert sector_core.get_ai_cache().get("โรงพยาบาลศิริราช") == answers[1]
+
+
+def test_classify_many_falls_back_to_single_requests(cohere):
+    stub = DroppingStub(drop=set())
+    cohere_stub.install(stub)
+    stub.drop_rate = 1.0  # every batched answer comes back empty
+    usage = {}
+
+    answers = sector_core.classify_many_with_ai(["ธนาคารกรุงไทย"], usage)
+
+    assert answers == [(BFSI, "ธนาคารกรุงไทย looks like this sector.")]
+    assert usage["requests"] == 1 + sector_core.BATCH_RETRY_ROUNDS
+    assert usage["single_requests"] == 1
+    assert "Company: ธนาคารกรุงไทย" in stub.messages[-1]
+
+
+class AsyncDroppingStub(DroppingStub, cohere_stub.AsyncStubCohere):
+    pass
+
+
+def test_bulk_batches_requery_dropped_items_one_at_a_time(cohere, tmp_path, monkeypatch):
+    from bulk_jobs import BulkJobStore
+
+    stub = AsyncDroppingStub(drop={"โรงพยาบาลศิริราช"})
+    cohere_stub.install(cohere, stub)
+    monkeypatch.setattr(sector_core, "predict_locally", lambda name, threshold=None: None)
+    results = {}
+
+    sector_core.run_bulk_classification(
+        ["Acme Logistics", "โรงพยาบาลศิริราช"], on_result=lambda row_idx, result, resumed: results.__setitem__(row_idx, result),
+        store=BulkJobStore(str(tmp_path / "jobs.sqlite3")),
+    )
+
+    assert [results[i]["ai_sector"] for i in range(2)] == ["Retail / SME / Logistics", HEALTH]
+    assert len(stub.messages) == 2
+    assert stub.messages[1].endswith("Company: โรงพยาบาลศิริราช")
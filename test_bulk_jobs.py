@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Resumable bulk jobs: checkpointed rows are skipped, failed AI rows retried, every row exported."""
+import csv
+
+import pytest
+
+from bulk_jobs import BulkJobStore, job_id_for, run_bulk_job, write_enriched_csv
+
+NAMES = ["Listed Org", "Acme Logistics", "Flaky Holdings", "Acme Logistics", ""]
+
+
+class FakeAI:
+    """Answers every name except those in `failing`, and records what it was asked."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.asked = []
+
+    async def __call__(self, name):
+        self.asked.append(name)
+        if name in self.failing:
+            return None, None
+        return "Retail / SME / Logistics", f"{name} ships things."
+
+
+def classify_static(name):
+    return "Critical Infrastructure (CII)" if name == "Listed Org" else None
+
+
+def enrich(sector):
+    return {"key_services": f"services for {sector}" if sector else "", "regulators": ""}
+
+
+def run(store, ai, names=NAMES, **kwargs):
+    results = {}
+    job_id = run_bulk_job(names, classify_static, ai, enrich, store,
+                          on_result=lambda row_idx, result, resumed: results.__setitem__(row_idx, (result, resumed)), **kwargs)
+    return job_id, results
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BulkJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_rerun_skips_finished_rows_and_retries_failed_ones(store):
+    first = FakeAI(failing={"Flaky Holdings"})
+    job_id, results = run(store, first)
+    # Duplicate names share one call; static hits and blank names never reach the AI
+    assert sorted(first.asked) == ["Acme Logistics", "Flaky Holdings"]
+    assert set(store.finished_rows(job_id)) == {0, 1, 3, 4}
+    assert results[2][0]["sector"] is None
+
+    second = FakeAI()
+    assert run(store, second)[0] == job_id
+    assert second.asked == ["Flaky Holdings"]
+    assert set(store.finished_rows(job_id)) == {0, 1, 2, 3, 4}
+
+    third = FakeAI()
+    _, results = run(store, third)
+    assert third.asked == []
+    assert all(resumed for _, resumed in results.values()) and len(results) == len(NAMES)
+
+
+def test_options_are_part_of_the_job(store):
+    job_id, _ = run(store, FakeAI())
+    ai = FakeAI()
+    other_id, results = run(store, ai, ai_for_static_hits=True)
+    assert other_id != job_id
+    assert "Listed Org" in ai.asked
+    assert results[0][0]["ai_sector"] == "Retail / SME / Logistics"
+    assert job_id_for(NAMES, {"a": 1}) != job_id_for(NAMES, {"a": 2})
+
+
+def test_failed_ai_call_on_a_static_hit_is_retried(store):
+    job_id, _ = run(store, FakeAI(failing={"Listed Org"}), ai_for_static_hits=True)
+    assert 0 not in store.finished_rows(job_id)
+
+
+def test_export_has_every_source_row(store, tmp_path):
+    job_id, _ = run(store, FakeAI(failing={"Flaky Holdings"}))
+    source_rows = [{"company": name, "owner": f"rep {i}"} for i, name in enumerate(NAMES)]
+    out_path = tmp_path / "out.csv"
+
+    finished = write_enriched_csv(job_id, store, str(out_path), NAMES, source_rows=source_rows, source_columns=["company", "owner"])
+
+    with open(out_path, newline="", encoding="utf-8-sig") as handle:
+        rows = list(csv.DictReader(handle))
+    assert finished == 4
+    assert [row["owner"] for row in rows] == [f"rep {i}" for i in range(len(NAMES))]
+    assert [row["company_name"] for row in rows] == NAMES
+    assert rows[0]["sector"] == "Critical Infrastructure (CII)"
+    assert rows[2]["sector"] == "" and rows[2]["ai_sector"] == ""
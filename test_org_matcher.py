@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""OrgMatcher against a naive substring scan over the same lists, and FuzzyIndex ranking."""
+import pickle
+import random
+
+import pytest
+
+from org_matcher import FuzzyIndex, OrgMatcher
+
+# A tiny alphabet makes overlapping names, shared prefixes and suffix chains likely
+ALPHABET = "abcกขค "
+
+
+def naive_match(lists, text):
+    """{lowercased name: [labels]} for every listed name contained in text."""
+    text = text.lower()
+    found = {}
+    for label, names in lists:
+        for name in names:
+            if name and name.lower() in text:
+                labels = found.setdefault(name.lower(), [])
+                if label not in labels:
+                    labels.append(label)
+    return found
+
+
+def naive_classify(lists, text):
+    text = text.lower()
+    for label, names in lists:
+        if any(name and name.lower() in text for name in names):
+            return label
+    return None
+
+
+def random_word(rng, low, high):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(low, high)))
+
+
+def random_lists(rng):
+    return [(label, [random_word(rng, 1, 5) for _ in range(rng.randint(0, 12))]) for label in ("CII", "Regulator", "Gov")]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_match_and_classify_agree_with_naive_scan(seed):
+    rng = random.Random(seed)
+    lists = random_lists(rng)
+    matcher = OrgMatcher(lists)
+    for _ in range(25):
+        text = random_word(rng, 0, 20)
+        found = {name.lower(): labels for name, labels in matcher.match(text).items()}
+        assert found == naive_match(lists, text)
+        assert matcher.classify(text) == naive_classify(lists, text)
+
+
+def test_case_insensitive_and_first_list_wins():
+    matcher = OrgMatcher([("CII", ["Bank of Thailand"]), ("Regulator", ["bank of thailand", "ธนาคาร"])])
+    assert matcher.match("The BANK OF THAILAND office") == {"Bank of Thailand": ["CII", "Regulator"]}
+    assert matcher.classify("ธนาคารแห่งประเทศไทย") == "Regulator"
+    assert matcher.classify("bank of thailand") == "CII"
+    assert matcher.classify("") is None
+    assert matcher.classify("unrelated") is None
+
+
+def test_survives_pickling():
+    rng = random.Random(7)
+    lists = random_lists(rng)
+    matcher = pickle.loads(pickle.dumps(OrgMatcher(lists), protocol=pickle.HIGHEST_PROTOCOL))
+    for _ in range(50):
+        text = random_word(rng, 0, 20)
+        assert matcher.classify(text) == naive_classify(lists, text)
+
+
+def test_ranked_search_prefix_hits_first_then_shortest():
+    index = FuzzyIndex(["ธนาคารกรุงไทย", "ธนาคารกรุงเทพ", "กรุงไทยประกันชีวิต", "กรุงไทย"], aliases={"ธนาคารกรุงไทย": ["KTB"]})
+    assert index.ranked_search("กรุงไทย", k=3) == [("กรุงไทย", 1.0), ("กรุงไทยประกันชีวิต", 1.0), ("ธนาคารกรุงไทย", 0.95)]
+    assert index.ranked_search("ktb") == [("ธนาคารกรุงไทย", 1.0)]
+
+
+def test_best_match_needs_the_alias_on_its_own():
+    index = FuzzyIndex(["ธนาคารกรุงไทย"], aliases={"ธนาคารกรุงไทย": ["KTB", "Krungthai"]})
+    assert index.best_match("KTB") == ("ธนาคารกรุงไทย", 1.0)
+    assert index.best_match("Krungthai Public Company Limited") == ("ธนาคารกรุงไทย", 1.0)
+    assert index.best_match("Krungthai AXA") is None
+    assert index.best_match("KTB Law") is None
+    assert index.best_match("ktb") is None
+
+
+def test_alias_match_skips_the_typo_pass():
+    index = FuzzyIndex(["กรมควบคุมโรค"], aliases={"กรมควบคุมโรค": ["DDC"]})
+    assert index.alias_match("DDC Co., Ltd.") == "กรมควบคุมโรค"
+    assert index.alias_match("ddc") is None
+    assert index.alias_match("กรมควบคมโรค") is None
+    assert index.best_match("กรมควบคมโรค") == ("กรมควบคุมโรค", 0.917)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Registry validation, snapshot reuse and invalidation, and the guards around swapping registries."""
+import json
+import os
+import shutil
+
+import pytest
+
+import registry
+import sector_core
+from registry import REGISTRY_FILES, RegistryError, compile_registry, data_signature, load_registry
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for file_name in REGISTRY_FILES:
+        shutil.copy(os.path.join(ROOT, "registry", file_name), tmp_path / file_name)
+    return tmp_path
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    # Make sure an mtime-based signature sees the edit even within the filesystem's timestamp granularity
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def append(path, line):
+    write(path, path.read_text(encoding="utf-8") + line + "\n")
+
+
+@pytest.mark.parametrize("file_name, text, message", [
+    ("manifest.json", '["oops"]', "expected an object"),
+    ("manifest.json", '{"precedence": "Regulator"}', "precedence must be a list"),
+    ("manifest.json", '{"precedence": ["No Such Sector"]}', "unknown sectors: No Such Sector"),
+    ("manifest.json", "{not json", "manifest.json"),
+    ("sectors.json", "[]", "expected an object of sector details"),
+    ("sectors.json", '{"Healthcare": "services"}', "expected an object of sector details"),
+    ("organizations.csv", "sector,org\nRegulator,x\n", "expected columns sector, name"),
+    ("organizations.csv", "sector,name\nRegulator,\n", "both sector and name are required"),
+    ("organizations.csv", "sector,name\nHealthcare,โรงพยาบาลศิริราช\n", "not in the manifest precedence"),
+    ("aliases.csv", "name,alias\nNot Listed,NL\n", "not in organizations.csv"),
+])
+def test_compile_rejects_bad_data(data_dir, file_name, text, message):
+    write(data_dir / file_name, text)
+    with pytest.raises(RegistryError, match=message):
+        compile_registry(str(data_dir))
+
+
+def test_compile_cleans_and_dedupes_names(data_dir):
+    append(data_dir / "organizations.csv", "Regulator,  สำนักงาน   ทดสอบ  ")
+    append(data_dir / "organizations.csv", "Regulator,สำนักงาน ทดสอบ")
+    compiled = compile_registry(str(data_dir))
+    names = dict(compiled.static_lists)["Regulator"]
+    assert names.count("สำนักงาน ทดสอบ") == 1
+    assert compiled.static_matcher.classify("สำนักงาน ทดสอบ จำกัด") == "Regulator"
+
+
+def test_snapshot_is_reused_until_a_data_file_changes(data_dir, tmp_path):
+    snapshot = str(tmp_path / "registry.snapshot")
+    first, compiled = load_registry(str(data_dir), snapshot)
+    assert compiled
+    second, compiled = load_registry(str(data_dir), snapshot)
+    assert not compiled and second.source_hash == first.source_hash
+
+    append(data_dir / "organizations.csv", "Regulator,สำนักงานทดสอบใหม่")
+    third, compiled = load_registry(str(data_dir), snapshot)
+    assert compiled and third.source_hash != first.source_hash
+    assert third.static_matcher.classify("สำนักงานทดสอบใหม่") == "Regulator"
+
+
+def test_snapshot_is_invalidated_by_a_code_change(data_dir, tmp_path, monkeypatch):
+    code_file = tmp_path / "matcher_code.py"
+    write(code_file, "VERSION = 1\n")
+    monkeypatch.setattr(registry, "SNAPSHOT_CODE_FILES", (str(code_file),))
+    snapshot = str(tmp_path / "registry.snapshot")
+    load_registry(str(data_dir), snapshot)
+    assert not load_registry(str(data_dir), snapshot)[1]
+    write(code_file, "VERSION = 2\n")
+    assert load_registry(str(data_dir), snapshot)[1]
+
+
+def test_unreadable_snapshot_falls_back_to_compiling(data_dir, tmp_path):
+    snapshot = tmp_path / "registry.snapshot"
+    snapshot.write_bytes(b"not a pickle")
+    compiled_registry, compiled = load_registry(str(data_dir), str(snapshot))
+    assert compiled and len(compiled_registry)
+    assert not load_registry(str(data_dir), str(snapshot))[1]
+
+
+def test_install_refuses_changed_sector_labels(data_dir):
+    details = json.loads((data_dir / "sectors.json").read_text(encoding="utf-8"))
+    details["Space Mining"] = {"key_services": []}
+    write(data_dir / "sectors.json", json.dumps(details, ensure_ascii=False))
+    current = sector_core.get_registry()
+    with pytest.raises(RegistryError, match="restart"):
+        sector_core.install_registry(compile_registry(str(data_dir)))
+    assert sector_core.get_registry() is current
+
+
+def test_failed_reload_is_recorded_and_not_retried(data_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(sector_core, "REGISTRY_DIR", str(data_dir))
+    monkeypatch.setattr(sector_core, "REGISTRY_SNAPSHOT", str(tmp_path / "registry.snapshot"))
+    # As if data_dir had been loaded, so get_registry() starts no reload of its own
+    monkeypatch.setattr(sector_core, "_registry_signature", data_signature(str(data_dir)))
+    monkeypatch.setattr(sector_core, "_registry_error", None)
+    current = sector_core.get_registry()
+    write(data_dir / "manifest.json", '["oops"]')
+
+    sector_core._reload_registry()
+
+    assert sector_core._registry_signature == data_signature(str(data_dir))
+    assert "manifest.json" in sector_core.registry_status()["error"]
+    assert sector_core.get_registry() is current
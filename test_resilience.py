@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""CircuitBreaker state changes and their handling in call_with_retries."""
+import asyncio
+
+import pytest
+
+from resilience import CircuitBreaker, ProviderUnavailable, call_with_retries, call_with_retries_async
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def open_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def fail(timeout):
+    raise ValueError("bad request")
+
+
+def test_opens_after_threshold_then_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    clock.now = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def time_out(timeout):
+    raise TimeoutError("read timed out")
+
+
+def test_non_transient_error_is_raised_but_not_counted():
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(ValueError):
+        call_with_retries(fail, breaker, deadline_seconds=5, attempt_timeout=1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert call_with_retries(lambda timeout: "ok", breaker, deadline_seconds=5, attempt_timeout=1) == "ok"
+
+
+def test_transient_error_is_counted():
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(TimeoutError):
+        call_with_retries(time_out, breaker, deadline_seconds=5, attempt_timeout=1, max_retries=0)
+    with pytest.raises(ProviderUnavailable):
+        call_with_retries(lambda timeout: "ok", breaker, deadline_seconds=5, attempt_timeout=1)
+
+
+def test_non_transient_error_releases_the_half_open_trial():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 10
+    with pytest.raises(ValueError):
+        call_with_retries(fail, breaker, deadline_seconds=5, attempt_timeout=1, clock=clock)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert call_with_retries(lambda timeout: "ok", breaker, deadline_seconds=5, attempt_timeout=1, clock=clock) == "ok"
+
+
+def test_interrupted_trial_does_not_keep_the_circuit_shut():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 10
+
+    def interrupted(timeout):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        call_with_retries(interrupted, breaker, deadline_seconds=5, attempt_timeout=1, clock=clock)
+    assert call_with_retries(lambda timeout: "ok", breaker, deadline_seconds=5, attempt_timeout=1, clock=clock) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_async_trial_does_not_keep_the_circuit_shut():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 10
+
+    async def hang(timeout):
+        await asyncio.sleep(60)
+
+    async def ok(timeout):
+        return "ok"
+
+    async def scenario():
+        task = asyncio.create_task(call_with_retries_async(hang, breaker, 5, 60, clock=clock))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await call_with_retries_async(ok, breaker, 5, 1, clock=clock)
+
+    assert asyncio.run(scenario()) == "ok"
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""FairScheduler quota and round-robin order, SingleFlight coalescing, and how chat() spends the quota."""
+import threading
+import time
+
+import pytest
+
+from resilience import ProviderUnavailable
+from scheduler import FairScheduler, SingleFlight
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.001)
+
+
+def test_rejects_a_rate_that_never_refills():
+    with pytest.raises(ValueError):
+        FairScheduler(rate=0, burst=10)
+    with pytest.raises(ValueError):
+        FairScheduler(rate=1, burst=0)
+
+
+def test_burst_then_timeout():
+    scheduler = FairScheduler(rate=0.001, burst=2)
+    scheduler.acquire("a")
+    assert scheduler.try_acquire()
+    assert not scheduler.try_acquire()
+    with pytest.raises(ProviderUnavailable):
+        scheduler.acquire("a", timeout=0.01)
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_sessions_take_turns():
+    scheduler = FairScheduler(rate=50, burst=1)
+    assert scheduler.try_acquire()
+    order = []
+    threads = []
+    for session in ["bulk", "bulk", "bulk", "single"]:
+        depth = scheduler.stats()["queue_depth"]
+        thread = threading.Thread(target=lambda s=session: order.append(s) if scheduler.acquire(s) is not None else None)
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: scheduler.stats()["queue_depth"] > depth)
+    for thread in threads:
+        thread.join()
+    assert order == ["bulk", "single", "bulk", "bulk"]
+
+
+def test_singleflight_runs_concurrent_callers_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait()
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.coalesced == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1] and results == ["answer"] * 5
+
+
+def test_every_chat_attempt_takes_a_rate_limit_token(cohere):
+    import cohere_stub
+    import sector_core
+
+    cohere.failure_rate = 1.0
+    with pytest.raises(cohere_stub.StubServiceUnavailable):
+        sector_core.chat(model=sector_core.AI_MODEL, message="Company: x")
+    assert cohere.requests == 1 + sector_core.AI_MAX_RETRIES
+    assert sector_core.get_ai_scheduler().stats()["granted"] == cohere.requests